@@ -0,0 +1,119 @@
+import json
+import os
+
+import pandas as pd
+
+from market_calendar import MARKET_TZ
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# Key of our entry in the Arrow schema metadata
+METADATA_KEY = b"stock_cache"
+BINARY_FORMATS = {".parquet": "parquet", ".feather": "feather", ".arrow": "feather"}
+MANIFEST_SUFFIX = ".manifest.json"
+
+
+def default_extension():
+    """'.parquet' when pyarrow is installed, otherwise '.csv'."""
+    return ".csv" if pa is None else ".parquet"
+
+
+def cache_format(path):
+    """'parquet', 'feather' or 'csv', from the file extension."""
+    fmt = BINARY_FORMATS.get(os.path.splitext(path)[1].lower(), "csv")
+    if fmt != "csv" and pa is None:
+        raise RuntimeError(f"pyarrow is required for {fmt} caches ({path}); use a .csv cache_file instead")
+    return fmt
+
+
+def _parse_dates(values):
+    # Intraday bars carry UTC offsets that change with DST, which parse_dates leaves as
+    # strings; parse them as UTC and show them in market time again
+    if len(values) and pd.Timestamp(values.iloc[0]).tz is not None:
+        return pd.to_datetime(values, utc=True).dt.tz_convert(MARKET_TZ)
+    return pd.to_datetime(values)
+
+
+def _normalize(df):
+    df = df.copy()
+    df['Close'] = pd.to_numeric(df['Close'], errors='raise').astype('float64')
+    return df
+
+
+def read_frame(path, index, memory_map=False):
+    """
+    Load a cache file as (frame, metadata). `index` names the index columns, e.g.
+    ['Date'] or ['Ticker', 'Date']. CSV caches carry no metadata and return {}.
+    """
+    fmt = cache_format(path)
+    if fmt == "csv":
+        df = pd.read_csv(path, dtype={'Ticker': str})
+        df['Date'] = _parse_dates(df['Date'])
+        return _normalize(df.set_index(index)), {}
+
+    if fmt == "parquet":
+        table = pq.read_table(path, memory_map=memory_map)
+    else:
+        table = feather.read_table(path, memory_map=memory_map)
+    raw = (table.schema.metadata or {}).get(METADATA_KEY)
+    metadata = json.loads(raw) if raw else {}
+    df = table.to_pandas()
+    if list(df.index.names) != list(index):
+        raise ValueError(f"{path} is indexed by {list(df.index.names)}, expected {list(index)}")
+    return _normalize(df), metadata
+
+
+def manifest_path(path):
+    return path + MANIFEST_SUFFIX
+
+
+def read_manifest(path):
+    """The manifest written next to a cache file, or None if there is none or it is unreadable."""
+    try:
+        with open(manifest_path(path), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def remove_cache(path):
+    for name in (path, manifest_path(path)):
+        if os.path.exists(name):
+            os.remove(name)
+
+
+def write_frame(df, path, metadata=None):
+    """
+    Write a cache file atomically. `metadata` is stored in the schema of binary formats
+    and, for every format, in a JSON manifest next to the file, so the cache key and
+    covered dates can be checked without loading the data.
+    """
+    fmt = cache_format(path)
+    tmp = f"{path}.tmp"
+    if fmt == "csv":
+        df.to_csv(tmp)
+    else:
+        table = pa.Table.from_pandas(_normalize(df), preserve_index=True)
+        schema_metadata = dict(table.schema.metadata or {})
+        schema_metadata[METADATA_KEY] = json.dumps(metadata or {}).encode('utf-8')
+        table = table.replace_schema_metadata(schema_metadata)
+        if fmt == "parquet":
+            pq.write_table(table, tmp)
+        else:
+            # Uncompressed so a memory-mapped read does not have to decompress into RAM
+            feather.write_feather(table, tmp, compression='uncompressed')
+    # Drop the old manifest first: a crash before the new one is written then leaves a
+    # cache without a manifest, which is rejected, instead of new data under an old key
+    if os.path.exists(manifest_path(path)):
+        os.remove(manifest_path(path))
+    os.replace(tmp, path)
+
+    tmp = f"{manifest_path(path)}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(metadata or {}, f, indent=1)
+    os.replace(tmp, manifest_path(path))
@@ -1,39 +1,109 @@
 import os
-import time
 import pandas as pd
 import yfinance as yf
 
+import market_calendar
+from cache_store import default_extension, read_frame, read_manifest, remove_cache, write_frame
+
+# yfinance period strings and how far back they reach; 'ytd' and 'max' are handled separately
+PERIOD_OFFSETS = {
+    "1d": pd.DateOffset(days=1),
+    "5d": pd.DateOffset(days=5),
+    "1mo": pd.DateOffset(months=1),
+    "3mo": pd.DateOffset(months=3),
+    "6mo": pd.DateOffset(months=6),
+    "1y": pd.DateOffset(years=1),
+    "2y": pd.DateOffset(years=2),
+    "5y": pd.DateOffset(years=5),
+    "10y": pd.DateOffset(years=10),
+}
+
+
+def period_start(period, now=None):
+    """First date covered by a yfinance period, or None for 'max'."""
+    today = (now or pd.Timestamp.now()).normalize()
+    if period == "max":
+        return None
+    if period == "ytd":
+        return today.replace(month=1, day=1)
+    return today - PERIOD_OFFSETS[period]
+
+
+def _localized_start(period, tz):
+    start = period_start(period)
+    if start is not None and tz is not None:
+        start = start.tz_localize(tz)
+    return start
+
+
+def _reaches_period_start(first, period):
+    """Whether data starting at `first` covers the period, with a week of slack for weekends and holidays."""
+    start = _localized_start(period, first.tz)
+    return start is None or first <= start + pd.Timedelta(days=7)
+
+
 class StockDownloader:
     """
     Responsible for downloading stock data from Yahoo Finance and caching it locally.
+    An expired cache is refreshed incrementally: only the bars since the last cached
+    date are downloaded and merged in. The cache format follows the cache_file
+    extension (.parquet, .feather or .csv); Parquet is the default when pyarrow is installed.
+    A manifest next to the cache records its ticker, interval and covered dates: caches
+    written for another ticker or interval are ignored, and freshness is judged from the
+    last bar against the market calendar rather than from the file's age.
     """
-    def __init__(self, ticker, period="6mo", interval="1d", cache_file="stock_cache.csv"):
+    def __init__(self, ticker, period="6mo", interval="1d", cache_file=None, memory_map=False):
         self.ticker = ticker
         self.period = period
         self.interval = interval
-        self.cache_file = cache_file
-        self.timeout = 600  # seconds
+        self.cache_file = cache_file or f"stock_cache{default_extension()}"
+        self.memory_map = memory_map
+        self.timeout = 600  # seconds a daily bar is trusted while the market is open
+        self.metadata = {}
 
-    def _is_cache_valid(self):
-        if not os.path.exists(self.cache_file):
+    def _key(self):
+        return {'ticker': self.ticker, 'interval': self.interval}
+
+    def _is_cache_valid(self, manifest):
+        """Whether the cache covers the period and still holds the latest bar the market could have produced."""
+        if not manifest.get('first'):
             return False
-        age = time.time() - os.path.getmtime(self.cache_file)
-        return age < self.timeout
+        return (_reaches_period_start(pd.Timestamp(manifest['first']), self.period)
+                and market_calendar.is_fresh(manifest['last'], manifest['fetched_at'], self.interval, self.timeout))
 
-    def fetch(self):
-        if self._is_cache_valid():
-            print("Using cached data...")
-            try:
-                df = pd.read_csv(self.cache_file, index_col=0, parse_dates=True)
-                df['Close'] = pd.to_numeric(df['Close'], errors='raise')
-                return df
-            except Exception as e:
-                print("Cache invalid:", e)
-                os.remove(self.cache_file)
+    def _read_cache(self):
+        df, self.metadata = read_frame(self.cache_file, ['Date'], self.memory_map)
+        return df
+
+    def _load(self):
+        """(cached frame, manifest) if the cache was written for this ticker and interval, else (None, None)."""
+        manifest = read_manifest(self.cache_file)
+        if manifest is None or manifest.get('key') != self._key() or not os.path.exists(self.cache_file):
+            return None, None
+        try:
+            cached = self._read_cache()
+        except Exception as e:
+            print("Cache invalid:", e)
+            remove_cache(self.cache_file)
+            return None, None
+        # Binary caches carry their own key; it wins over a manifest left by an older write
+        if self.metadata and self.metadata.get('key') != self._key():
+            return None, None
+        return cached, manifest
 
-        print("Downloading fresh data...")
-        df = yf.download(self.ticker, period=self.period, interval=self.interval)
+    def _write_cache(self, df):
+        self.metadata = {
+            'key': self._key(),
+            'period': self.period,
+            'first': None if df.empty else df.index.min().isoformat(),
+            'last': None if df.empty else df.index.max().isoformat(),
+            'rows': len(df),
+            'fetched_at': pd.Timestamp.now(tz='UTC').isoformat(),
+        }
+        write_frame(df, self.cache_file, self.metadata)
 
+    def _close_frame(self, df):
+        """Reduce a yf.download result to a single 'Close' column."""
         # Handle possible multi-index
         if isinstance(df.columns, pd.MultiIndex):
             df = df['Close']
@@ -43,6 +113,168 @@ class StockDownloader:
                 df = df.rename(columns={self.ticker: 'Close'})
         else:
             df = df[['Close']]
+        return df
+
+    def _trim(self, df):
+        """Drop bars that fell out of the requested period."""
+        start = _localized_start(self.period, df.index.tz)
+        if start is None or df.empty:
+            return df
+        return df[df.index >= start]
+
+    def _refresh(self, cached):
+        """
+        Download the bars from the last cached date on and merge them into cached.
+        Returns None if the cache does not reach back to the start of the period.
+        """
+        if cached.empty or not _reaches_period_start(cached.index.min(), self.period):
+            return None
+
+        # Re-fetch the last cached day too: its bar may have been written before the close
+        since = cached.index.max().strftime("%Y-%m-%d")
+        print(f"Refreshing cached data since {since}...")
+        tail = self._close_frame(yf.download(self.ticker, start=since, interval=self.interval))
+        merged = pd.concat([cached, tail])
+        merged = merged[~merged.index.duplicated(keep='last')].sort_index()
+        return self._trim(merged)
+
+    def fetch(self):
+        cached, manifest = self._load()
+        if cached is not None and self._is_cache_valid(manifest):
+            print("Using cached data...")
+            return self._trim(cached)
 
-        df.to_csv(self.cache_file)
+        df = self._refresh(cached) if cached is not None else None
+        if df is None:
+            print("Downloading fresh data...")
+            df = self._trim(self._close_frame(yf.download(self.ticker, period=self.period, interval=self.interval)))
+
+        self._write_cache(df)
         return df
+
+
+class WatchlistDownloader:
+    """
+    Downloads closing prices for many tickers and keeps them in one long-format cache
+    indexed by (Ticker, Date). Tickers whose cached history covers the period are
+    refreshed with one batched download of the missing tail; the rest get one batched
+    full download. yfinance fetches the tickers of a batch on parallel threads. The
+    manifest keeps the covered dates and fetch time of every ticker, so only tickers
+    that are missing, too short or stale by the market calendar are downloaded.
+    """
+    def __init__(self, tickers, period="6mo", interval="1d", cache_file=None, max_workers=8, memory_map=False):
+        self.tickers = list(dict.fromkeys(tickers))
+        self.period = period
+        self.interval = interval
+        self.cache_file = cache_file or f"watchlist_cache{default_extension()}"
+        self.max_workers = max_workers
+        self.memory_map = memory_map
+        self.timeout = 600  # seconds a daily bar is trusted while the market is open
+        self.metadata = {}
+
+    def _key(self):
+        return {'interval': self.interval}
+
+    def _read_cache(self):
+        df, self.metadata = read_frame(self.cache_file, ['Ticker', 'Date'], self.memory_map)
+        return df.sort_index()
+
+    def _load(self):
+        """(cached frame, manifest) if the cache was written for this interval, else (None, None)."""
+        manifest = read_manifest(self.cache_file)
+        if manifest is None or manifest.get('key') != self._key() or not os.path.exists(self.cache_file):
+            return None, None
+        try:
+            cached = self._read_cache()
+        except Exception as e:
+            print("Cache invalid:", e)
+            remove_cache(self.cache_file)
+            return None, None
+        # Binary caches carry their own key; it wins over a manifest left by an older write
+        if self.metadata and self.metadata.get('key') != self._key():
+            return None, None
+        return cached, manifest
+
+    def _write_cache(self, df, previous, downloaded):
+        """
+        Write df; tickers in `downloaded` were fetched just now, the rest keep their fetch
+        time from `previous`. Tickers that returned no data get an entry without dates,
+        so they are retried on the same schedule as stale data rather than on every fetch.
+        """
+        now = pd.Timestamp.now(tz='UTC').isoformat()
+        previous = (previous or {}).get('tickers', {})
+        tickers = {ticker: entry for ticker, entry in previous.items() if entry['first'] is None}
+        tickers.update({ticker: {'first': None, 'last': None, 'fetched_at': now} for ticker in downloaded})
+        if not df.empty:
+            dates = df.reset_index('Date').groupby(level='Ticker')['Date'].agg(['min', 'max'])
+            for ticker, row in dates.iterrows():
+                fetched_at = now if ticker in downloaded or ticker not in previous else previous[ticker]['fetched_at']
+                tickers[ticker] = {'first': row['min'].isoformat(), 'last': row['max'].isoformat(),
+                                   'fetched_at': fetched_at}
+        self.metadata = {'key': self._key(), 'period': self.period, 'rows': len(df), 'tickers': tickers}
+        write_frame(df, self.cache_file, self.metadata)
+
+    def _download(self, tickers, **kwargs):
+        """Batched yf.download, reshaped to the long (Ticker, Date) -> Close layout."""
+        df = yf.download(tickers, interval=self.interval, threads=self.max_workers, **kwargs)
+        if df is None or df.empty:
+            return pd.DataFrame({'Close': []}, index=pd.MultiIndex.from_arrays([[], []], names=['Ticker', 'Date']))
+        close = df['Close']
+        if isinstance(close, pd.Series):
+            close = close.to_frame(name=tickers[0])
+        # Tickers that failed to download come back as all-NaN columns
+        long = close.rename_axis(index='Date', columns='Ticker').stack(future_stack=True).dropna()
+        return long.to_frame(name='Close').swaplevel().sort_index()
+
+    def _trim(self, df):
+        if df.empty:
+            return df
+        dates = df.index.get_level_values('Date')
+        start = _localized_start(self.period, dates.tz)
+        return df if start is None else df[dates >= start]
+
+    def _plan(self, manifest):
+        """Split the watchlist into (tickers to download in full, {stale ticker: last cached bar})."""
+        entries = (manifest or {}).get('tickers', {})
+        full, refresh = [], {}
+        for ticker in self.tickers:
+            entry = entries.get(ticker)
+            if entry is not None and entry['first'] is None:
+                # Nothing came back last time (delisted or unknown symbol)
+                if not market_calendar.is_fresh(entry['fetched_at'], entry['fetched_at'], self.interval, self.timeout):
+                    full.append(ticker)
+            elif entry is None or not _reaches_period_start(pd.Timestamp(entry['first']), self.period):
+                full.append(ticker)
+            elif not market_calendar.is_fresh(entry['last'], entry['fetched_at'], self.interval, self.timeout):
+                refresh[ticker] = pd.Timestamp(entry['last'])
+        return full, refresh
+
+    def _select(self, df):
+        return df[df.index.get_level_values('Ticker').isin(self.tickers)]
+
+    def fetch(self):
+        cached, manifest = self._load()
+        full, refresh = self._plan(manifest)
+        if not full and not refresh:
+            print("Using cached data...")
+            return self._select(self._trim(cached))
+
+        frames = [] if cached is None else [cached]
+        if refresh:
+            # Re-fetch the oldest last cached day too: its bar may have been written before the close
+            since = min(refresh.values()).strftime("%Y-%m-%d")
+            print(f"Refreshing {len(refresh)} cached tickers since {since}...")
+            frames.append(self._download(list(refresh), start=since))
+        if full:
+            print(f"Downloading fresh data for {len(full)} tickers...")
+            frames.append(self._download(full, period=self.period))
+
+        merged = pd.concat(frames)
+        merged = self._trim(merged[~merged.index.duplicated(keep='last')].sort_index())
+        self._write_cache(merged, manifest, set(full) | set(refresh))
+        return self._select(merged)
+
+    def close_prices(self, data=None):
+        """Closing prices as a wide frame, one column per ticker."""
+        data = self.fetch() if data is None else data
+        return data['Close'].unstack('Ticker')
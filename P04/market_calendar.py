@@ -0,0 +1,94 @@
+import pandas as pd
+from pandas.tseries.holiday import (
+    AbstractHolidayCalendar, GoodFriday, Holiday, USLaborDay, USMartinLutherKingJr, USMemorialDay,
+    USPresidentsDay, USThanksgivingDay, nearest_workday, sunday_to_monday,
+)
+from pandas.tseries.offsets import CustomBusinessDay
+
+MARKET_TZ = "America/New_York"
+SESSION_OPEN = pd.Timedelta(hours=9, minutes=30)
+SESSION_CLOSE = pd.Timedelta(hours=16)
+# Yahoo publishes the final bars of a session a few minutes after the close
+SETTLE = pd.Timedelta(minutes=15)
+
+INTRADAY_STEPS = {
+    "1m": pd.Timedelta(minutes=1),
+    "2m": pd.Timedelta(minutes=2),
+    "5m": pd.Timedelta(minutes=5),
+    "15m": pd.Timedelta(minutes=15),
+    "30m": pd.Timedelta(minutes=30),
+    "60m": pd.Timedelta(minutes=60),
+    "90m": pd.Timedelta(minutes=90),
+    "1h": pd.Timedelta(hours=1),
+}
+
+
+class NYSEHolidayCalendar(AbstractHolidayCalendar):
+    """Full-day NYSE closures; early closes and one-off closures are not modelled."""
+    rules = [
+        Holiday("New Year's Day", month=1, day=1, observance=sunday_to_monday),
+        USMartinLutherKingJr,
+        USPresidentsDay,
+        GoodFriday,
+        USMemorialDay,
+        Holiday("Juneteenth", month=6, day=19, start_date="2022-06-19", observance=nearest_workday),
+        Holiday("Independence Day", month=7, day=4, observance=nearest_workday),
+        USLaborDay,
+        USThanksgivingDay,
+        Holiday("Christmas Day", month=12, day=25, observance=nearest_workday),
+    ]
+
+
+SESSION_DAY = CustomBusinessDay(calendar=NYSEHolidayCalendar())
+
+
+def market_now():
+    return pd.Timestamp.now(tz=MARKET_TZ)
+
+
+def to_market_time(moment):
+    """A bar or fetch timestamp in market time; naive values are taken to be market time already."""
+    moment = pd.Timestamp(moment)
+    return moment.tz_localize(MARKET_TZ) if moment.tz is None else moment.tz_convert(MARKET_TZ)
+
+
+def is_session_day(day):
+    day = pd.Timestamp(day).tz_localize(None).normalize()
+    return SESSION_DAY.is_on_offset(day)
+
+
+def is_open(now=None):
+    now = to_market_time(now if now is not None else market_now())
+    day = now.normalize()
+    return is_session_day(day) and day + SESSION_OPEN <= now < day + SESSION_CLOSE
+
+
+def last_close(now=None):
+    """Close of the most recent session that has finished by `now`, in market time."""
+    now = to_market_time(now if now is not None else market_now())
+    day = now.tz_localize(None).normalize()
+    if not (is_session_day(day) and now.tz_localize(None) >= day + SESSION_CLOSE):
+        day = SESSION_DAY.rollback(day - pd.Timedelta(days=1))
+    return (day + SESSION_CLOSE).tz_localize(MARKET_TZ)
+
+
+def is_fresh(last_bar, fetched_at, interval, timeout, now=None):
+    """
+    Whether data ending at `last_bar` and fetched at `fetched_at` can still be served.
+    Outside trading hours it is fresh only if it was fetched after the last finished
+    session settled: a bar dated in that session but fetched before the close may be
+    partial. During a session intraday data is fresh until its next bar is due, and
+    daily data, whose current bar keeps moving, for `timeout` seconds after the fetch.
+    """
+    now = to_market_time(now if now is not None else market_now())
+    last_bar = to_market_time(last_bar)
+    fetched_at = to_market_time(fetched_at)
+    step = INTRADAY_STEPS.get(interval)
+
+    if is_open(now):
+        if step is not None:
+            # Bars are labelled by their start, so the bar after last_bar completes at + 2 steps
+            return now < last_bar + 2 * step
+        return (now - fetched_at).total_seconds() < timeout
+
+    return fetched_at >= last_close(now) + SETTLE
@@ -0,0 +1,35 @@
+import csv
+import itertools
+import json
+
+
+def read_journeys(source):
+    """
+    Yield (start_city, end_city) pairs from a text stream in either format:
+
+    * JSONL, one object per line with "from" and "to" keys
+    * CSV with a "from,to" header, or just two columns per row without a header
+    """
+    lines = (line for line in source if line.strip())
+    first = next(lines, None)
+    if first is None:
+        return
+    lines = itertools.chain([first], lines)
+
+    if first.lstrip().startswith('{'):
+        for line in lines:
+            journey = json.loads(line)
+            yield journey.get('from', ''), journey.get('to', '')
+        return
+
+    rows = csv.reader(lines)
+    header = next(rows)
+    names = [column.strip().lower() for column in header]
+    if 'from' in names and 'to' in names:
+        start_col, end_col = names.index('from'), names.index('to')
+    else:
+        start_col, end_col = 0, 1
+        rows = itertools.chain([header], rows)
+    for row in rows:
+        if len(row) > max(start_col, end_col):
+            yield row[start_col], row[end_col]
@@ -0,0 +1,217 @@
+"""
+Local stand-in for transport.opendata.ch and Nominatim that replays the responses in
+benchmarks/fixtures/. Point the app at it with TRAIN_APP_TRANSPORT_URL=<url>/v1,
+TRAIN_APP_NOMINATIM_DOMAIN=<host:port> and TRAIN_APP_NOMINATIM_SCHEME=http.
+
+    python -m benchmarks.fake_upstream serve --port 8765 --latency 0.05 --failure-rate 0.01
+    python -m benchmarks.fake_upstream record Zurich Lyon --pairs Zurich:Geneva
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+_TIME_FORMAT = "%Y-%m-%dT%H:%M:%S%z"
+
+
+def _load_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _synthetic_coordinates(query):
+    # Unknown names still get a stable answer somewhere in western Europe
+    digest = hashlib.sha1(query.encode('utf-8')).digest()
+    return 42.0 + digest[0] / 255 * 10, -2.0 + digest[1] / 255 * 16
+
+
+def _shift_connections(connections, now):
+    """Move recorded departure/arrival times so the first train leaves a few minutes from now."""
+    departures = [datetime.strptime(c['from']['departure'], _TIME_FORMAT) for c in connections if c['from'].get('departure')]
+    if not departures:
+        return connections
+    first = min(departures)
+    target = now.astimezone(first.tzinfo).replace(second=0, microsecond=0) + timedelta(minutes=5)
+    delta = target - first
+    shifted = []
+    for connection in connections:
+        connection = json.loads(json.dumps(connection))
+        for side, field in (('from', 'departure'), ('to', 'arrival')):
+            value = connection[side].get(field)
+            if value:
+                connection[side][field] = (datetime.strptime(value, _TIME_FORMAT) + delta).strftime(_TIME_FORMAT)
+        shifted.append(connection)
+    return shifted
+
+
+class FakeUpstream:
+    """
+    Threaded HTTP server answering /v1/locations, /v1/connections and /search from the
+    fixtures. `latency` (+/- `jitter`) seconds are added to every response, `failure_rate`
+    of requests get `failure_status`, and `empty_rate` of connection queries find nothing.
+    """
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, jitter=0.0, failure_rate=0.0,
+                 failure_status=503, empty_rate=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.failure_status = failure_status
+        self.empty_rate = empty_rate
+        self.locations = _load_fixture("locations.json")
+        self.connections = _load_fixture("connections.json")
+        self.nominatim = _load_fixture("nominatim.json")
+        self.requests = {}  # endpoint -> count
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def netloc(self):
+        return urlsplit(self.url).netloc
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _roll(self, rate):
+        with self._lock:
+            return self._random.random() < rate
+
+    def _delay(self):
+        with self._lock:
+            delay = self.latency + (self._random.uniform(-self.jitter, self.jitter) if self.jitter else 0.0)
+        if delay > 0:
+            time.sleep(delay)
+
+    def respond(self, path, query):
+        """Return (status, body) for a request path and its parsed query string."""
+        endpoint = path.rstrip('/').rsplit('/', 1)[-1]
+        with self._lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+        self._delay()
+        if self._roll(self.failure_rate):
+            return self.failure_status, {'errors': [{'message': "Injected failure"}]}
+
+        if endpoint == 'locations':
+            name = query.get('query', [''])[0]
+            found = self.locations.get(name.strip().casefold())
+            if found is None:
+                lat, lon = _synthetic_coordinates(name.casefold())
+                found = {'stations': [{'id': '', 'name': name, 'coordinate': {'type': 'WGS84', 'x': lat, 'y': lon}}]}
+            return 200, found
+
+        if endpoint == 'connections':
+            from_city, to_city = query.get('from', [''])[0], query.get('to', [''])[0]
+            if self._roll(self.empty_rate):
+                return 200, {'connections': []}
+            recorded = self.connections.get(f"{from_city.casefold()}|{to_city.casefold()}", self.connections['default'])
+            return 200, {'connections': _shift_connections(recorded['connections'], datetime.now().astimezone())}
+
+        if endpoint == 'search':
+            name = query.get('q', [''])[0]
+            found = self.nominatim.get(name.strip().casefold())
+            if found is None:
+                lat, lon = _synthetic_coordinates(name.casefold())
+                found = [{'place_id': 0, 'lat': str(lat), 'lon': str(lon), 'display_name': f"{name}, France"}]
+            return 200, found
+
+        return 404, {'errors': [{'message': f"Unknown endpoint {path}"}]}
+
+    def _handler_class(self):
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like the real APIs
+            disable_nagle_algorithm = True  # headers and body go out in separate writes
+
+            def do_GET(self):
+                parts = urlsplit(self.path)
+                status, body = upstream.respond(parts.path, parse_qs(parts.query))
+                payload = json.dumps(body, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def record(cities, pairs):
+    """Fetch live responses for the given cities and city pairs and merge them into the fixtures."""
+    from http_client import NOMINATIM_HOST, NOMINATIM_SCHEME, TRANSPORT_API_URL, get_client
+
+    client = get_client()
+    fixtures = {name: _load_fixture(name) for name in ("locations.json", "nominatim.json", "connections.json")}
+    for city in cities:
+        response = client.get(f"{TRANSPORT_API_URL}/locations", params={'query': city})
+        fixtures["locations.json"][city.casefold()] = response.json()
+        response = client.get(f"{NOMINATIM_SCHEME}://{NOMINATIM_HOST}/search", params={'q': city, 'format': 'json', 'limit': 1})
+        fixtures["nominatim.json"][city.casefold()] = response.json()
+    for from_city, to_city in pairs:
+        response = client.get(f"{TRANSPORT_API_URL}/connections", params={'from': from_city, 'to': to_city, 'limit': 6})
+        fixtures["connections.json"][f"{from_city.casefold()}|{to_city.casefold()}"] = response.json()
+    for name, data in fixtures.items():
+        with open(os.path.join(FIXTURES_DIR, name), "w", encoding='utf-8') as f:
+            json.dump(data, f, indent=1, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay or record upstream API fixtures.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    serve = commands.add_parser('serve', help="run the stand-in server until interrupted")
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=8765)
+    serve.add_argument('--latency', type=float, default=0.0, help="seconds added to every response")
+    serve.add_argument('--jitter', type=float, default=0.0, help="+/- seconds of random latency")
+    serve.add_argument('--failure-rate', type=float, default=0.0, help="fraction of requests answered with --failure-status")
+    serve.add_argument('--failure-status', type=int, default=503)
+    serve.add_argument('--empty-rate', type=float, default=0.0, help="fraction of connection queries with no results")
+    rec = commands.add_parser('record', help="fetch live responses into the fixtures")
+    rec.add_argument('cities', nargs='*')
+    rec.add_argument('--pairs', nargs='*', default=[], metavar='FROM:TO')
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        upstream = FakeUpstream(args.host, args.port, args.latency, args.jitter, args.failure_rate,
+                                args.failure_status, args.empty_rate)
+        print(f"Serving fixtures on {upstream.url}")
+        print(f"  TRAIN_APP_TRANSPORT_URL={upstream.url}/v1")
+        print(f"  TRAIN_APP_NOMINATIM_DOMAIN={upstream.netloc} TRAIN_APP_NOMINATIM_SCHEME=http")
+        try:
+            upstream.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    else:
+        record(args.cities, [tuple(pair.split(':', 1)) for pair in args.pairs])
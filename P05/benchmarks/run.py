@@ -0,0 +1,264 @@
+"""
+Offline benchmarks for the P05 planner. Upstream APIs are replaced by FakeUpstream and
+every file the app writes (databases, caches, logs, snapshots) goes to a temporary
+directory. Run from the P05 directory:
+
+    python -m benchmarks.run
+    python -m benchmarks.run nearest --sizes 100 1000 100000
+    python -m benchmarks.run connections reachability --latency 0.02 --failure-rate 0.05
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.fake_upstream import FakeUpstream
+from benchmarks.synthetic import LATITUDE_RANGE, LONGITUDE_RANGE, synthetic_cities, write_sqlite, write_tinydb
+
+BENCHMARKS = ('nearest', 'connections', 'reachability', 'init', 'startup')
+P05_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ('geopy', 'numpy', 'tinydb', 'requests', 'haversine', 'aiohttp')
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+class Result:
+    """One benchmark row: `ops` operations in `seconds` wall time, with per-operation latencies."""
+    def __init__(self, name, size, ops, seconds, latencies):
+        self.name = name
+        self.size = size
+        self.ops = ops
+        self.seconds = seconds
+        self.latencies = sorted(latencies)
+
+    def as_dict(self):
+        return {
+            'benchmark': self.name,
+            'size': self.size,
+            'ops': self.ops,
+            'seconds': self.seconds,
+            'throughput': self.ops / self.seconds if self.seconds else None,
+            'p50_ms': percentile(self.latencies, 0.50) * 1000,
+            'p99_ms': percentile(self.latencies, 0.99) * 1000,
+            'mean_ms': statistics.fmean(self.latencies) * 1000,
+        }
+
+
+def format_results(results):
+    lines = [f"{'benchmark':<44}{'size':>8}{'ops':>8}{'ops/s':>12}{'p50 ms':>10}{'p99 ms':>10}"]
+    for result in results:
+        row = result.as_dict()
+        lines.append(f"{row['benchmark']:<44}{row['size']:>8}{row['ops']:>8}{row['throughput']:>12.1f}"
+                     f"{row['p50_ms']:>10.3f}{row['p99_ms']:>10.3f}")
+    return "\n".join(lines)
+
+
+def timed_calls(fn, args_list, workers=1):
+    """Call fn(*args) for every args tuple; return (wall seconds, per-call latencies)."""
+    def call(args):
+        started = time.perf_counter()
+        fn(*args)
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            latencies = list(pool.map(call, args_list))
+    else:
+        latencies = [call(args) for args in args_list]
+    return time.perf_counter() - started, latencies
+
+
+def random_point(rng):
+    return rng.uniform(*LATITUDE_RANGE), rng.uniform(*LONGITUDE_RANGE)
+
+
+def bench_nearest(args):
+    from train import Database, Logger, RouteCalculator
+
+    rng = random.Random(args.seed)
+    logger = Logger()
+    results = []
+    for size in args.sizes:
+        storage = write_sqlite(f"nearest_{size}.sqlite", synthetic_cities(size, args.seed))
+        calculator = RouteCalculator(Database(storage=storage), logger)
+
+        seconds, latencies = timed_calls(calculator.get_city_index, [()])
+        results.append(Result('nearest: build index', size, 1, seconds, latencies))
+
+        queries = [(random_point(rng), random_point(rng)) for _ in range(args.queries)]
+        seconds, latencies = timed_calls(calculator.find_nearest_city_within_angle, queries)
+        results.append(Result('find_nearest_city_within_angle', size, len(queries), seconds, latencies))
+        storage.close()
+    return results
+
+
+def bench_connections(args):
+    from connection_cache import ConnectionCache
+    from http_client import get_client
+    from train import Database, Logger, TransportService
+
+    rng = random.Random(args.seed)
+    cities = synthetic_cities(1000, args.seed)
+    storage = write_sqlite("connections.sqlite", cities)
+    transport = TransportService(Database(storage=storage), Logger(), get_client(), ConnectionCache(max_entries=args.queries))
+    transport.verbose = False
+
+    pairs = [(a['city'], b['city']) for a, b in (rng.sample(cities, 2) for _ in range(args.queries))]
+    results = []
+    seconds, latencies = timed_calls(transport.fetch_connections, pairs, args.concurrency)
+    results.append(Result(f'fetch_connections: cold x{args.concurrency}', len(cities), len(pairs), seconds, latencies))
+    seconds, latencies = timed_calls(transport.fetch_connections, pairs, args.concurrency)
+    results.append(Result(f'fetch_connections: cached x{args.concurrency}', len(cities), len(pairs), seconds, latencies))
+    storage.close()
+    return results
+
+
+def bench_reachability(args):
+    # reachability reads ./city_data.json (no city_data.sqlite in the work directory)
+    write_tinydb("city_data.json", synthetic_cities(args.reachability_size, args.seed))
+    import reachability
+
+    start = reachability.all_cities()[0]['name']
+    destinations = [(start, city['name']) for city in reachability._destinations(start)]
+    results = []
+
+    seconds, latencies = timed_calls(reachability.is_reachable, destinations)
+    results.append(Result('is_reachable', args.reachability_size, len(destinations), seconds, latencies))
+
+    for incremental in (False, True):
+        runs = []
+        for _ in range(args.repeat):
+            with contextlib.redirect_stdout(io.StringIO()):
+                runs.append(timed_calls(reachability.update_reachability_snapshot, [(start, incremental)])[0])
+        label = 'update_reachability_snapshot' + (' --incremental' if incremental else '')
+        results.append(Result(label, args.reachability_size, len(runs), sum(runs), runs))
+
+    try:
+        import aiohttp  # noqa: F401
+    except ImportError:
+        print("aiohttp not installed, skipping the async reachability benchmark", file=sys.stderr)
+        return results
+    runs = []
+    for _ in range(args.repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            runs.append(timed_calls(reachability.update_reachability_snapshots_async,
+                                    [([start], args.concurrency, 0)])[0])
+    results.append(Result(f'update_reachability_snapshots_async x{args.concurrency}',
+                          args.reachability_size, len(runs), sum(runs), runs))
+    return results
+
+
+def bench_init(args):
+    from db_initializer import DatabaseInitializer
+
+    runs = []
+    rows = 0
+    for i in range(args.repeat):
+        initializer = DatabaseInitializer(f"init_{i}.json", max_workers=args.concurrency)
+        with contextlib.redirect_stdout(io.StringIO()):
+            runs.append(timed_calls(initializer.initialize_database, [()])[0])
+        rows = len(initializer.storage.get_all_cities())
+        initializer.storage.close()
+    return [Result(f'initialize_database x{args.concurrency}', rows, len(runs), sum(runs), runs)]
+
+
+# Runs in a fresh interpreter: time the import, TrainApp() and one domestic query
+_STARTUP_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+import train
+imported = time.perf_counter()
+app = train.TrainApp('city_data.json')
+app.transport_service.verbose = False
+app.plan_journey('Zurich', 'Geneva')
+done = time.perf_counter()
+print(json.dumps({'import': imported - started, 'query': done - started,
+                  'modules': [m for m in %r if m in sys.modules]}))
+""" % (HEAVY_MODULES,)
+
+
+def bench_startup(args):
+    shutil.copy(os.path.join(P05_DIR, "city_data.json"), "city_data.json")
+    env = dict(os.environ, PYTHONPATH=P05_DIR)
+    imports, queries, processes = [], [], []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        output = subprocess.run([sys.executable, "-c", _STARTUP_SCRIPT], env=env, check=True,
+                                capture_output=True, text=True).stdout
+        processes.append(time.perf_counter() - started)
+        run = json.loads(output.strip().splitlines()[-1])
+        imports.append(run['import'])
+        queries.append(run['query'])
+    print(f"startup: heavy modules loaded by a domestic query: {', '.join(run['modules']) or 'none'}", file=sys.stderr)
+    return [
+        Result('startup: import train', 1, len(imports), sum(imports), imports),
+        Result('startup: import + Swiss query', 1, len(queries), sum(queries), queries),
+        Result('startup: whole process', 1, len(processes), sum(processes), processes),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks against a local stand-in for the upstream APIs.")
+    parser.add_argument('benchmarks', nargs='*', metavar='BENCHMARK',
+                        help=f"any of {', '.join(BENCHMARKS)} (default: all)")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000, 100000],
+                        help="synthetic city table sizes for the nearest-city benchmark")
+    parser.add_argument('--queries', type=int, default=1000, help="queries per nearest-city and connections run")
+    parser.add_argument('--reachability-size', type=int, default=200, help="cities in the reachability table")
+    parser.add_argument('--repeat', type=int, default=3, help="runs of the whole-snapshot and init benchmarks")
+    parser.add_argument('--concurrency', type=int, default=8, help="worker threads / requests in flight")
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds the stand-in server adds per response")
+    parser.add_argument('--jitter', type=float, default=0.0, help="+/- seconds of random latency")
+    parser.add_argument('--failure-rate', type=float, default=0.0, help="fraction of upstream requests failing with 503")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', metavar='FILE', help="also write the results as JSON")
+    args = parser.parse_args()
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(sorted(unknown))}")
+    json_path = os.path.abspath(args.json) if args.json else None
+
+    upstream = FakeUpstream(latency=args.latency, jitter=args.jitter, failure_rate=args.failure_rate, seed=args.seed)
+    # Must be set before the first import of http_client, which reads them once
+    os.environ['TRAIN_APP_TRANSPORT_URL'] = f"{upstream.url}/v1"
+    os.environ['TRAIN_APP_NOMINATIM_DOMAIN'] = upstream.netloc
+    os.environ['TRAIN_APP_NOMINATIM_SCHEME'] = "http"
+
+    from http_client import configure_client
+    # No rate limits against the local server, and short backoffs so injected failures
+    # show up as retries rather than as seconds of sleeping
+    configure_client(pool_size=max(10, args.concurrency), rate_limits={}, backoff=0.01, max_backoff=0.1)
+
+    results = []
+    with upstream, tempfile.TemporaryDirectory(prefix="p05-bench-") as workdir:
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            for name in args.benchmarks or BENCHMARKS:
+                results += globals()[f"bench_{name}"](args)
+        finally:
+            os.chdir(cwd)
+        print(format_results(results))
+        print(f"\nupstream requests: {upstream.requests}")
+
+    if json_path:
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump([result.as_dict() for result in results], f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+import json
+import random
+
+# Roughly the area the planner covers, from Portugal to Poland
+LATITUDE_RANGE = (36.0, 58.0)
+LONGITUDE_RANGE = (-9.0, 24.0)
+
+
+def synthetic_cities(count, seed=0):
+    """`count` city rows in the shape of the cities table, scattered uniformly over Europe."""
+    rng = random.Random(seed)
+    return [
+        {
+            'city': f"Synth{i:06d}",
+            'id': str(9000000 + i),
+            'name': f"Synth{i:06d} Station",
+            'latitude': round(rng.uniform(*LATITUDE_RANGE), 6),
+            'longitude': round(rng.uniform(*LONGITUDE_RANGE), 6),
+            'country': 'France',
+        }
+        for i in range(count)
+    ]
+
+
+def write_sqlite(path, rows):
+    """Create an SQLite city table at path and return its SQLiteStorage."""
+    from storage import SQLiteStorage
+
+    storage = SQLiteStorage(path)
+    storage.add_cities(rows)
+    return storage
+
+
+def write_tinydb(path, rows):
+    """Write rows as the cities table of a TinyDB file, as db_initializer would."""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'cities': {str(i + 1): row for i, row in enumerate(rows)}}, f)
@@ -0,0 +1,106 @@
+import atexit
+import threading
+import time
+
+
+class Blacklist:
+    """
+    In-memory set of (from_city, to_city) pairs without connections, loaded once from
+    storage. New pairs are persisted in batches (write-behind), duplicates are ignored,
+    and a pair expires after `expiry` seconds so the route is queried again. Changes are
+    written once `flush_size` are pending, and otherwise by a daemon thread within
+    `flush_interval` seconds, so a long-running process loses at most that window.
+    """
+    def __init__(self, storage, expiry=7 * 24 * 3600, flush_size=20, flush_interval=30):
+        self.storage = storage
+        self.expiry = expiry
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # storage writes happen one at a time
+        self._entries = {}   # (from_city, to_city) -> added_at
+        self._pending = {}   # pairs added since the last flush
+        self._expired = set()  # pairs to delete at the next flush
+        self._last_flush = time.monotonic()
+        self._flusher = None  # started with the first unsaved change
+        self._stopped = threading.Event()
+
+        now = time.time()
+        for row in storage.get_blacklist():
+            pair = (row['from_city'], row['to_city'])
+            added_at = row.get('added_at')
+            if added_at is None:
+                # Rows written before expiry existed start their clock now
+                added_at = now
+                self._pending[pair] = added_at
+            self._entries[pair] = added_at
+        if self._pending:
+            self._start_flusher()
+        atexit.register(self.close)
+
+    def _start_flusher(self):
+        # Called with _lock held, or from __init__
+        if self._flusher is None:
+            self._flusher = threading.Thread(target=self._flush_periodically, name="blacklist-flush", daemon=True)
+            self._flusher.start()
+
+    def _flush_periodically(self):
+        while not self._stopped.wait(self.flush_interval):
+            if self._pending or self._expired:
+                self.flush()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _is_expired(self, added_at, now):
+        return self.expiry is not None and added_at + self.expiry <= now
+
+    def contains(self, from_city, to_city):
+        pair = (from_city, to_city)
+        with self._lock:
+            added_at = self._entries.get(pair)
+            if added_at is None:
+                return False
+            if self._is_expired(added_at, time.time()):
+                del self._entries[pair]
+                self._pending.pop(pair, None)
+                self._expired.add(pair)
+                self._start_flusher()
+                return False
+            return True
+
+    def add(self, from_city, to_city):
+        """Blacklist a pair; returns False if it was already blacklisted."""
+        pair = (from_city, to_city)
+        now = time.time()
+        with self._lock:
+            added_at = self._entries.get(pair)
+            if added_at is not None and not self._is_expired(added_at, now):
+                return False
+            self._entries[pair] = now
+            self._pending[pair] = now
+            self._expired.discard(pair)
+            self._start_flusher()
+            due = len(self._pending) >= self.flush_size or time.monotonic() - self._last_flush >= self.flush_interval
+        if due:
+            self.flush()
+        return True
+
+    def flush(self):
+        """Write pending additions and expirations to storage."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                expired, self._expired = self._expired, set()
+                self._last_flush = time.monotonic()
+            if expired:
+                self.storage.remove_blacklist_entries(expired)
+            if pending:
+                self.storage.save_blacklist_entries(
+                    [{'from_city': f, 'to_city': t, 'added_at': added_at} for (f, t), added_at in pending.items()]
+                )
+
+    def close(self):
+        """Stop the background flusher and write anything still pending."""
+        self._stopped.set()
+        self.flush()
@@ -0,0 +1,94 @@
+import re
+from datetime import datetime
+
+_DURATION = re.compile(r'(\d+)d(\d+):(\d+):(\d+)')
+
+_CLOCK = [f"{minute // 60:02d}:{minute % 60:02d}" for minute in range(24 * 60)]
+
+TABLE_HEADER = "Time\t\t\tJourney\t\t\tProducts\t\t\tPlatform\n" + "-" * 100 + "\n"
+CSV_COLUMNS = ('departure', 'arrival', 'duration_minutes', 'products', 'from_platform', 'to_platform')
+
+
+def parse_duration_minutes(duration):
+    """Convert a transport API duration such as '00d01:23:00' to minutes, or None."""
+    if not duration:
+        return None
+    if len(duration) == 11 and duration[2] == 'd':
+        # The API always sends this fixed width; slicing is much cheaper than the regex
+        try:
+            return (int(duration[:2]) * 24 + int(duration[3:5])) * 60 + int(duration[6:8])
+        except ValueError:
+            pass
+    match = _DURATION.match(duration)
+    if match is None:
+        return None
+    days, hours, minutes, _ = match.groups()
+    return (int(days) * 24 + int(hours)) * 60 + int(minutes)
+
+
+def _parse_time(value):
+    # fromisoformat is implemented in C; a pure-Python parser with a cached tzinfo is several times slower
+    return datetime.fromisoformat(value) if value else None
+
+
+def _clock(moment):
+    # Station local time, as sent by the API; a table lookup is far cheaper than strftime
+    return _CLOCK[moment.hour * 60 + moment.minute] if moment else 'Unknown'
+
+
+class Connection:
+    """One connection from the transport API, parsed once and rendered in several formats."""
+    __slots__ = ('departure', 'arrival', 'duration_minutes', 'products', 'from_platform', 'to_platform')
+
+    def __init__(self, departure, arrival, duration_minutes, products, from_platform, to_platform):
+        self.departure = departure
+        self.arrival = arrival
+        self.duration_minutes = duration_minutes
+        self.products = products
+        self.from_platform = from_platform
+        self.to_platform = to_platform
+
+    @classmethod
+    def from_api(cls, raw):
+        from_info = raw.get('from') or {}
+        to_info = raw.get('to') or {}
+        products = raw.get('products')
+        return cls(
+            _parse_time(from_info.get('departure')),
+            _parse_time(to_info.get('arrival')),
+            parse_duration_minutes(raw.get('duration')),
+            tuple(products) if products is not None else None,
+            from_info.get('platform'),
+            to_info.get('platform'),
+        )
+
+    @property
+    def duration_text(self):
+        minutes = self.duration_minutes
+        return f"{minutes // 60}h {minutes % 60}m" if minutes is not None else 'Unknown'
+
+    def table_row(self):
+        products = ", ".join(self.products) if self.products is not None else 'Unknown'
+        return (f"{_clock(self.departure)} - {_clock(self.arrival)}\t{self.duration_text}\t\t{products}\t\t"
+                f"{self.from_platform or 'Unknown'} to {self.to_platform or 'Unknown'}\n")
+
+    def csv_row(self):
+        """Values in CSV_COLUMNS order."""
+        return [
+            self.departure.isoformat() if self.departure else '',
+            self.arrival.isoformat() if self.arrival else '',
+            '' if self.duration_minutes is None else self.duration_minutes,
+            ", ".join(self.products) if self.products else '',
+            self.from_platform or '',
+            self.to_platform or '',
+        ]
+
+
+def parse_connections(raw_connections):
+    """Connection records for the dict entries of an API 'connections' list."""
+    return [Connection.from_api(raw) for raw in raw_connections or () if isinstance(raw, dict)]
+
+
+def render_table(connections):
+    return TABLE_HEADER + "".join([connection.table_row() for connection in connections])
+
@@ -0,0 +1,93 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+
+def departure_timestamp(connection):
+    departure = (connection.get('from') or {}).get('departure')
+    if not departure:
+        return None
+    return datetime.fromisoformat(departure).timestamp()
+
+
+class ConnectionCache:
+    """
+    Size-bounded LRU cache of connection lists. Queries for the next departures are keyed
+    by (from, to); queries for an explicit departure time add its `bucket_seconds` bucket.
+
+    An entry is fresh until its first connection departs (at most `fresh_ttl` seconds),
+    then stale until its last connection departs. Stale entries are still served, minus
+    the connections that already left, while a background refresh replaces them.
+    Expired entries are dropped on every put.
+    """
+    def __init__(self, bucket_seconds=900, fresh_ttl=300, max_entries=1024):
+        self.bucket_seconds = bucket_seconds
+        self.fresh_ttl = fresh_ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (fresh_until, expires_at, [(departs_at, connection)])
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def key(self, from_city, to_city, departure=None):
+        # "Now" queries share one entry whose lifetime follows its departures, not the clock's bucket
+        bucket = int(departure // self.bucket_seconds) if departure is not None else None
+        return from_city.strip().casefold(), to_city.strip().casefold(), bucket
+
+    def get(self, key):
+        """Return (connections, state) where state is 'fresh', 'stale' or None on a miss."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= now:
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None, None
+            self._entries.move_to_end(key)
+            fresh_until, _, timed = entry
+            if fresh_until > now:
+                self.hits += 1
+                return [conn for _, conn in timed], 'fresh'
+            self.stale_hits += 1
+            return [conn for departs_at, conn in timed if departs_at is None or departs_at > now], 'stale'
+
+    def put(self, key, connections):
+        if not connections:
+            return
+        now = time.time()
+        timed = [(departure_timestamp(conn), conn) for conn in connections]
+        departures = [departs_at for departs_at, _ in timed if departs_at is not None]
+        # Without parseable departures fall back to a plain fresh_ttl lifetime
+        expires_at = max(departures) if departures else now + self.fresh_ttl
+        fresh_until = min(min(departures) if departures else expires_at, now + self.fresh_ttl)
+        with self._lock:
+            for expired in [k for k, entry in self._entries.items() if entry[1] <= now]:
+                del self._entries[expired]
+            self._entries[key] = (fresh_until, expires_at, timed)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def refresh_in_background(self, key, loader):
+        """Run loader() in a daemon thread and store its result, at most one refresh per key at a time."""
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def run():
+            try:
+                connections = loader()
+                if connections:
+                    self.put(key, connections)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def stats(self):
+        return {'hits': self.hits, 'stale_hits': self.stale_hits, 'misses': self.misses, 'entries': len(self._entries)}
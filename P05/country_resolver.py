@@ -0,0 +1,115 @@
+import json
+import math
+import os
+import threading
+
+from geo_cache import make_key
+
+BORDERS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "country_borders.json")
+# The polygons are simplified by a few km; points closer than this to an edge are ambiguous
+BORDER_MARGIN_KM = 10
+KM_PER_DEGREE = 111.2
+
+
+def _point_in_ring(lon, lat, ring):
+    """Even-odd ray casting test for a closed [lon, lat] ring."""
+    inside = False
+    x1, y1 = ring[-1]
+    for x2, y2 in ring:
+        if (y1 > lat) != (y2 > lat) and lon < (x2 - x1) * (lat - y1) / (y2 - y1) + x1:
+            inside = not inside
+        x1, y1 = x2, y2
+    return inside
+
+
+def _distance_to_ring_km(lon, lat, ring):
+    """Approximate distance from a point to the nearest edge of a [lon, lat] ring."""
+    scale = math.cos(math.radians(lat))
+    best = math.inf
+    x1, y1 = (ring[-1][0] - lon) * scale, ring[-1][1] - lat
+    for x2, y2 in ring:
+        x2, y2 = (x2 - lon) * scale, y2 - lat
+        dx, dy = x2 - x1, y2 - y1
+        # Closest point of the segment to the origin (the query point)
+        t = 0.0 if dx == dy == 0 else max(0.0, min(1.0, -(x1 * dx + y1 * dy) / (dx * dx + dy * dy)))
+        best = min(best, math.hypot(x1 + t * dx, y1 + t * dy))
+        x1, y1 = x2, y2
+    return best * KM_PER_DEGREE
+
+
+class CountryResolver:
+    """
+    Offline country lookup. A city name is resolved from the cities table (its stored
+    country, or the border shape its coordinates fall in), then from coordinates or
+    addresses already in the geocode cache. Returns None when nothing is known locally.
+    """
+    def __init__(self, database, geo_cache=None, borders_file=BORDERS_FILE):
+        self.database = database
+        self.geo_cache = geo_cache
+        with open(borders_file, encoding='utf-8') as f:
+            countries = json.load(f)['countries']
+        # (name, bbox, rings); polygon countries get their bbox from their rings for a cheap pre-check
+        self._shapes = []
+        for country in countries:
+            rings = country.get('polygons')
+            for ring in rings or [None]:
+                if ring is None:
+                    bbox = country['bbox']
+                else:
+                    lons, lats = [p[0] for p in ring], [p[1] for p in ring]
+                    bbox = (min(lons), min(lats), max(lons), max(lats))
+                self._shapes.append((country['name'], bbox, ring))
+        self._cities_version = None
+        self._cities = {}
+        self._lock = threading.Lock()
+
+    def country_at(self, latitude, longitude):
+        """
+        The country whose shape contains the point, or None when that is not certain:
+        inside several polygons, within BORDER_MARGIN_KM of a polygon edge, or (outside
+        every polygon) inside no or several bounding boxes.
+        """
+        margin = BORDER_MARGIN_KM / KM_PER_DEGREE
+        in_polygons, in_boxes = set(), set()
+        for name, (min_lon, min_lat, max_lon, max_lat), ring in self._shapes:
+            if ring is None:
+                if min_lon <= longitude <= max_lon and min_lat <= latitude <= max_lat:
+                    in_boxes.add(name)
+                continue
+            # The margin in longitude degrees grows away from the equator; 2x covers Europe
+            if not (min_lon - 2 * margin <= longitude <= max_lon + 2 * margin
+                    and min_lat - margin <= latitude <= max_lat + margin):
+                continue
+            if _distance_to_ring_km(longitude, latitude, ring) < BORDER_MARGIN_KM:
+                return None
+            if _point_in_ring(longitude, latitude, ring):
+                in_polygons.add(name)
+        if in_polygons:
+            return in_polygons.pop() if len(in_polygons) == 1 else None
+        return in_boxes.pop() if len(in_boxes) == 1 else None
+
+    def _city_lookup(self):
+        with self._lock:
+            version = self.database.cities_version()
+            if version != self._cities_version:
+                cities = {}
+                for city in self.database.get_all_cities():
+                    cities.setdefault(city['city'].casefold(), city)
+                    cities.setdefault(city['name'].casefold(), city)
+                self._cities = cities
+                self._cities_version = version
+            return self._cities
+
+    def resolve(self, city):
+        row = self._city_lookup().get(city.strip().casefold())
+        if row is not None:
+            return row.get('country') or self.country_at(row['latitude'], row['longitude'])
+
+        if self.geo_cache is not None:
+            found, location = self.geo_cache.lookup(make_key('nominatim', city))
+            if found and location:
+                return location['address'].split(',')[-1].strip()
+            found, coords = self.geo_cache.lookup(make_key('opendata', city))
+            if found and coords:
+                return self.country_at(*coords)
+        return None
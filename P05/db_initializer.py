@@ -1,43 +1,42 @@
 import logging
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
-from geopy.geocoders import Nominatim
-from tinydb import TinyDB, Query
+
+from http_client import NOMINATIM_HOST, TRANSPORT_API_URL, get_client, make_geocoder
+from log_setup import configure_logging
+from storage import default_db_file, open_storage
 
 
 class DatabaseInitializer:
-    def __init__(self, db_file='city_data.json'):
+    def __init__(self, db_file='city_data.json', max_workers=4):
         # Setup logging
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(levelname)s - %(message)s',
-            handlers=[
-                logging.FileHandler("train_app.log", encoding='utf-8')
-            ]
-        )
-        self.logger = logging
+        configure_logging()
+        self.logger = logging.getLogger('train_app.db_initializer')
+        self.http = get_client()
+        # One geocoder for all lookups; the shared client's limiter keeps it at 1 request/s
+        self.geolocator = make_geocoder()
+        self.max_workers = max_workers
         
-        # TinyDB setup
-        self.db = TinyDB(db_file)
-        self.city_table = self.db.table('cities')
-        self.company_table = self.db.table('train_companies')
-        self.blacklist_table = self.db.table('blacklist')
+        # TinyDB or SQLite, by file extension, like train.py
+        self.storage = open_storage(db_file)
         
         # List of cities in Switzerland and France
-        self.cities = [
-            # Switzerland
+        self.swiss_cities = [
             "Zurich", "Geneva", "Basel", "Lausanne", "Bern", "Winterthur", "Lucerne", "St. Gallen", "Lugano",
             "Biel/Bienne", "La Chaux-de-Fonds", "Fribourg", "Schaffhausen", "Chur", "Neuchâtel", "Thun", "Sion", 
             "Uster", "Sierre", "Zug", "Montreux", "Yverdon-les-Bains", "Schlieren", "Vevey", "Nyon", "Vernier", 
             "Köniz", "Wettingen", "Frauenfeld", "Bellinzona", "Aarau", "Baden", "Bulle", "Carouge", "Crissier", 
             "Ecublens", "Emmen", "Lausanne", "Lancy", "Martigny", "Meyrin", "Morges", "Neuchâtel", "Onex", 
             "Renens", "Sierre", "Sion", "Thalwil", "Thun", "Vevey", "Veyrier", "Zollikon",
-
-            # France
+        ]
+        self.french_cities = [
             "Paris", "Lyon", "Marseille", "Nice", "Nantes", "Strasbourg", "Montpellier", "Lille",
             "Rennes", "Reims", "Saint-Étienne", "Toulon", "Grenoble", "Dijon", "Angers", "Nîmes",
             "Metz", "Rouen", "Brest", "Le Mans", "Tours", "Clermont-Ferrand", "Limoges", "Perpignan",
             "Avignon", "Besançon", "Orléans", "Mulhouse", "Troyes", "Poitiers", "Pau",
         ]
+        self.cities = self.swiss_cities + self.french_cities
 
         # Train companies data
         self.train_companies = {
@@ -84,8 +83,18 @@ class DatabaseInitializer:
         }
 
     def fetch_coordinates_geopy(self, city, country=None):
-        geolocator = Nominatim(user_agent="train_app")
-        location = geolocator.geocode(f"{city}, {country}" if country else city)
+        from geopy.exc import GeopyError
+
+        self.http.throttle(NOMINATIM_HOST)
+        try:
+            location = self.geolocator.geocode(f"{city}, {country}" if country else city)
+        except GeopyError as e:
+            # Timeouts, rate limiting and service errors; one failure must not abort the whole initialization
+            self.logger.error("Geocoding failed for %s: %s", city, e)
+            return None
+        except Exception as e:
+            self.logger.error("Unexpected error geocoding %s: %s", city, e)
+            return None
         if location:
             return {
                 'city': city,
@@ -96,41 +105,34 @@ class DatabaseInitializer:
         return None
 
     def fetch_coordinates_api(self, city):
-        url = "http://transport.opendata.ch/v1/locations"
+        url = f"{TRANSPORT_API_URL}/locations"
         params = {'query': city}
-        max_retries = 2
-
-        for attempt in range(max_retries):
-            try:
-                response = requests.get(url, params=params)
-                response.raise_for_status()
-                data = response.json()
-                if 'stations' in data and data['stations']:
-                    station = data['stations'][0]
-                    if 'coordinate' in station and station['coordinate']:
-                        lat = station['coordinate']['x']
-                        lon = station['coordinate']['y']
-                        if lat is not None and lon is not None:
-                            if -90 <= lat <= 90 and -180 <= lon <= 180:
-                                return {
-                                    'city': city,
-                                    'id': station.get('id', ''),
-                                    'name': station.get('name', city),
-                                    'latitude': lat,
-                                    'longitude': lon
-                                }
-                break  # If response is OK but no valid data, don't retry
-            
-            except (requests.Timeout, requests.ConnectionError) as e:
-                self.logger.warning(f"Attempt {attempt+1}: Temporary error fetching coordinates for {city}: {e}")
-                if attempt == max_retries - 1:
-                    self.logger.error(f"Failed to fetch coordinates for {city} after {max_retries} attempts.")
-            except requests.HTTPError as e:
-                self.logger.error(f"HTTP error fetching coordinates for {city}: {e}")
-                break  # Hard error, don't retry
-            except Exception as e:
-                self.logger.error(f"Unexpected error fetching coordinates for {city}: {e}")
-                break
+
+        try:
+            response = self.http.get(url, params=params)
+            response.raise_for_status()
+            data = response.json()
+            if 'stations' in data and data['stations']:
+                station = data['stations'][0]
+                if 'coordinate' in station and station['coordinate']:
+                    lat = station['coordinate']['x']
+                    lon = station['coordinate']['y']
+                    if lat is not None and lon is not None:
+                        if -90 <= lat <= 90 and -180 <= lon <= 180:
+                            return {
+                                'city': city,
+                                'id': station.get('id', ''),
+                                'name': station.get('name', city),
+                                'latitude': lat,
+                                'longitude': lon
+                            }
+
+        except (requests.Timeout, requests.ConnectionError) as e:
+            self.logger.error("Failed to fetch coordinates for %s after %d attempts: %s", city, self.http.max_retries + 1, e)
+        except requests.HTTPError as e:
+            self.logger.error("HTTP error fetching coordinates for %s: %s", city, e)
+        except Exception as e:
+            self.logger.error("Unexpected error fetching coordinates for %s: %s", city, e)
         return None
 
     def fetch_coordinates(self, city, country=None):
@@ -141,36 +143,53 @@ class DatabaseInitializer:
         return self.fetch_coordinates_geopy(city, country)
 
     def add_city_to_db(self, city_data):
-        City = Query()
-        if not self.city_table.contains(City.city == city_data['city']):
-            self.logger.info(f"Adding {city_data['city']} to database")
-            self.city_table.insert(city_data)
+        if city_data['city'] not in {row['city'] for row in self.storage.get_all_cities()}:
+            self.logger.info("Adding %s to database", city_data['city'])
+            self.storage.add_cities([city_data])
 
     def add_train_company_to_db(self, country, variations):
-        Company = Query()
         url = self.train_company_urls[country]
+        known = {row['country'] for row in self.storage.get_train_companies()}
         for variation in variations:
-            if not self.company_table.contains(Company.country == variation):
-                self.logger.info(f"Adding train company {url} for {variation} to database")
-                self.company_table.insert({'country': variation, 'url': url})
+            if variation not in known:
+                self.logger.info("Adding train company %s for %s to database", url, variation)
+                self.storage.add_train_companies([{'country': variation, 'url': url}])
+
+    def unique_cities(self):
+        """(city, country) pairs for the city list, duplicates removed, in list order."""
+        swiss = set(self.swiss_cities)
+        return [(city, "Switzerland" if city in swiss else "France") for city in dict.fromkeys(self.cities)]
 
     def initialize_database(self):
         print("Initializing database...")
-        # Fetch coordinates for all cities
-        for city in self.cities:
-            country = "Switzerland" if city in self.cities[:48] else "France"
-            coord = self.fetch_coordinates(city, country)
-            if coord:
-                self.add_city_to_db(coord)
+        existing = {row['city'] for row in self.storage.get_all_cities()}
+        jobs = [(city, country) for city, country in self.unique_cities() if city not in existing]
+
+        # Fetch coordinates concurrently; the shared HTTP client enforces the per-host rate limits
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            results = list(pool.map(lambda job: self.fetch_coordinates(*job), jobs))
+
+        # Keep the country the city was looked up for; it answers offline country queries
+        new_rows = [dict(coord, country=country) for coord, (_, country) in zip(results, jobs) if coord]
+        if new_rows:
+            self.logger.info("Adding %d cities to database", len(new_rows))
+            self.storage.add_cities(new_rows)
 
         # Add train companies
-        for country, variations in self.train_companies.items():
-            self.add_train_company_to_db(country, variations)
+        known = {row['country'] for row in self.storage.get_train_companies()}
+        companies = [
+            {'country': variation, 'url': self.train_company_urls[country]}
+            for country, variations in self.train_companies.items()
+            for variation in variations if variation not in known
+        ]
+        if companies:
+            self.logger.info("Adding %d train company entries to database", len(companies))
+            self.storage.add_train_companies(companies)
         
         print("Database initialization complete!")
         return True
 
 
 if __name__ == "__main__":
-    initializer = DatabaseInitializer()
+    initializer = DatabaseInitializer(default_db_file())
     initializer.initialize_database()
\ No newline at end of file
@@ -0,0 +1,94 @@
+import numpy as np
+
+from spatial_index import EARTH_RADIUS_KM
+
+
+def _haversine_rad(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km between broadcastable arrays of radian coordinates."""
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def _bearing_rad(lat1, lon1, lat2, lon2):
+    """Initial compass bearing in degrees (0-360) between broadcastable arrays of radian coordinates."""
+    d_lon = lon2 - lon1
+    x = np.sin(d_lon) * np.cos(lat2)
+    y = np.cos(lat1) * np.sin(lat2) - np.sin(lat1) * np.cos(lat2) * np.cos(d_lon)
+    return np.degrees(np.arctan2(x, y)) % 360
+
+
+def _as_radians(coords):
+    arr = np.radians(np.asarray(coords, dtype=np.float64).reshape(-1, 2))
+    return np.ascontiguousarray(arr[:, 0]), np.ascontiguousarray(arr[:, 1])
+
+
+class BatchDistanceEngine:
+    """
+    Keeps the city coordinates as contiguous float64 arrays and scores many
+    origin/destination pairs against all of them in vectorized passes.
+    """
+    chunk_size = 512  # pairs per pass, bounds the (pairs x cities) temporaries
+
+    def __init__(self, cities):
+        self.cities = list(cities)
+        self.lat, self.lon = _as_radians([(c['latitude'], c['longitude']) for c in self.cities])
+
+    def __len__(self):
+        return len(self.cities)
+
+    def distances_from(self, coords):
+        """Distance in km from coords to every city, in table order."""
+        lat, lon = _as_radians(coords)
+        return _haversine_rad(lat[0], lon[0], self.lat, self.lon)
+
+    def bearings_from(self, coords):
+        """Bearing in degrees from coords to every city, in table order."""
+        lat, lon = _as_radians(coords)
+        return _bearing_rad(lat[0], lon[0], self.lat, self.lon)
+
+    def score(self, starts, ends, max_angle):
+        """
+        For each start/end pair, pick the city closest to the end whose bearing from the
+        start lies within max_angle of the start -> end bearing.
+
+        Returns a dict of arrays, one entry per pair: 'index' (-1 if no city qualifies),
+        'total_km', 'heading', 'remaining_km' and 'percentage_covered'.
+        """
+        s_lat, s_lon = _as_radians(starts)
+        e_lat, e_lon = _as_radians(ends)
+        count = len(s_lat)
+
+        index = np.full(count, -1, dtype=np.int64)
+        remaining = np.full(count, np.nan)
+        covered = np.full(count, np.nan)
+        total = _haversine_rad(s_lat, s_lon, e_lat, e_lon)
+        heading = _bearing_rad(s_lat, s_lon, e_lat, e_lon)
+
+        if len(self.cities):
+            for lo in range(0, count, self.chunk_size):
+                hi = min(lo + self.chunk_size, count)
+                sl, so = s_lat[lo:hi, None], s_lon[lo:hi, None]
+                el, eo = e_lat[lo:hi, None], e_lon[lo:hi, None]
+
+                diff = np.abs(_bearing_rad(sl, so, self.lat, self.lon) - heading[lo:hi, None]) % 360
+                in_cone = np.minimum(diff, 360 - diff) <= max_angle
+                to_end = np.where(in_cone, _haversine_rad(el, eo, self.lat, self.lon), np.inf)
+
+                best = np.argmin(to_end, axis=1)
+                rows = np.arange(hi - lo)
+                found = np.isfinite(to_end[rows, best])
+                partial = _haversine_rad(s_lat[lo:hi], s_lon[lo:hi], self.lat[best], self.lon[best])
+
+                index[lo:hi] = np.where(found, best, -1)
+                remaining[lo:hi] = np.where(found, to_end[rows, best], np.nan)
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    pct = np.where(total[lo:hi] > 0, partial / total[lo:hi] * 100, np.nan)
+                covered[lo:hi] = np.where(found, pct, np.nan)
+
+        return {
+            'index': index,
+            'total_km': total,
+            'heading': heading,
+            'remaining_km': remaining,
+            'percentage_covered': covered,
+        }
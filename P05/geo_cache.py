@@ -0,0 +1,103 @@
+import json
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+def make_key(kind, city, country=None):
+    """Build a cache key from a lookup kind and a normalized city/country pair."""
+    def normalize(text):
+        if not text:
+            return ''
+        return ' '.join(unicodedata.normalize('NFKC', text).casefold().split())
+    return f"{kind}|{normalize(city)}|{normalize(country)}"
+
+
+class GeocodeCache:
+    """
+    Persistent geocoding cache: an SQLite file with per-entry expiry, fronted by an
+    in-memory LRU. A stored value of None is a cached negative result ("not found").
+    """
+    def __init__(self, db_file='geocode_cache.sqlite', ttl=30 * 24 * 3600, negative_ttl=24 * 3600, memory_size=1024):
+        self.db_file = db_file
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.memory_size = memory_size
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_file, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS geocode ("
+            "key TEXT PRIMARY KEY, value TEXT, expires_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def _remember(self, key, expires_at, value):
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def lookup(self, key):
+        """Return (found, value); found is False if the key is missing or expired."""
+        value = self._lookup(key)
+        if value is _MISSING:
+            return False, None
+        return True, value
+
+    def _lookup(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._memory[key]
+
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM geocode WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or row[1] <= now:
+                self.misses += 1
+                return _MISSING
+            value = json.loads(row[0])
+            self._remember(key, row[1], value)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        """Store value (None for a negative result) with the matching TTL."""
+        expires_at = time.time() + (self.negative_ttl if value is None else self.ttl)
+        with self._lock:
+            self._remember(key, expires_at, value)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO geocode (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), expires_at)
+            )
+            self._conn.commit()
+
+    def purge_expired(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM geocode WHERE expires_at <= ?", (time.time(),))
+            self._conn.commit()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'memory_entries': len(self._memory),
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,142 @@
+import os
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Upstream endpoints; override them to use a mirror or a local stand-in such as benchmarks/fake_upstream.py
+TRANSPORT_API_URL = os.environ.get('TRAIN_APP_TRANSPORT_URL', "http://transport.opendata.ch/v1").rstrip('/')
+NOMINATIM_DOMAIN = os.environ.get('TRAIN_APP_NOMINATIM_DOMAIN', "nominatim.openstreetmap.org")
+NOMINATIM_SCHEME = os.environ.get('TRAIN_APP_NOMINATIM_SCHEME', "https")
+
+# Rate limits are keyed by host[:port]
+TRANSPORT_HOST = urlsplit(TRANSPORT_API_URL).netloc
+NOMINATIM_HOST = NOMINATIM_DOMAIN
+
+# Requests per second allowed per host; Nominatim's usage policy asks for at most one
+DEFAULT_RATE_LIMITS = {
+    TRANSPORT_HOST: 3.0,
+    NOMINATIM_HOST: 1.0,
+}
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class RateLimiter:
+    """Spaces out calls so that at most `rate` calls per second are started."""
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+class AsyncRateLimiter:
+    """asyncio counterpart of RateLimiter, for use inside a single event loop."""
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next_slot = 0.0
+
+    async def wait(self):
+        now = time.monotonic()
+        slot = max(now, self._next_slot)
+        self._next_slot = slot + self.interval
+        if slot > now:
+            import asyncio  # kept out of module import; the synchronous CLI never needs it
+
+            await asyncio.sleep(slot - now)
+
+
+def backoff_delay(attempt, backoff=0.5, max_backoff=8.0):
+    # "Full jitter": a random delay up to the exponential cap
+    return random.uniform(0, min(max_backoff, backoff * 2 ** attempt))
+
+
+class HttpClient:
+    """
+    Shared HTTP transport for the P05 services: one pooled keep-alive session,
+    uniform timeouts, retries with jittered exponential backoff and per-host rate limits.
+    """
+    def __init__(self, pool_size=10, timeout=(5, 20), max_retries=2, backoff=0.5, max_backoff=8.0, rate_limits=None):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.session = requests.Session()
+        self.session.headers['User-Agent'] = "train_app"
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        limits = DEFAULT_RATE_LIMITS if rate_limits is None else rate_limits
+        self._limiters = {host: RateLimiter(rate) for host, rate in limits.items()}
+
+    def throttle(self, host):
+        """Block until the rate limit for host allows another request."""
+        limiter = self._limiters.get(host)
+        if limiter:
+            limiter.wait()
+
+    def _sleep_backoff(self, attempt):
+        time.sleep(backoff_delay(attempt, self.backoff, self.max_backoff))
+
+    def get(self, url, params=None, timeout=None):
+        """
+        GET url, retrying connection errors, timeouts and 429/5xx responses.
+        Returns the last response, or raises the last requests exception.
+        """
+        host = urlsplit(url).netloc
+        for attempt in range(self.max_retries + 1):
+            self.throttle(host)
+            try:
+                response = self.session.get(url, params=params, timeout=timeout or self.timeout)
+            except (requests.Timeout, requests.ConnectionError):
+                if attempt == self.max_retries:
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                    return response
+                response.close()
+            self._sleep_backoff(attempt)
+
+    def close(self):
+        self.session.close()
+
+
+_default_client = None
+_default_lock = threading.Lock()
+
+
+def get_client():
+    """Return the process-wide HttpClient, creating it on first use."""
+    global _default_client
+    with _default_lock:
+        if _default_client is None:
+            _default_client = HttpClient()
+        return _default_client
+
+
+def configure_client(**kwargs):
+    """Replace the process-wide HttpClient with one built from HttpClient keyword arguments."""
+    global _default_client
+    with _default_lock:
+        if _default_client is not None:
+            _default_client.close()
+        _default_client = HttpClient(**kwargs)
+        return _default_client
+
+
+def make_geocoder(user_agent="train_app"):
+    """geopy Nominatim geocoder for the configured Nominatim domain and scheme."""
+    from geopy.geocoders import Nominatim
+    return Nominatim(user_agent=user_agent, domain=NOMINATIM_DOMAIN, scheme=NOMINATIM_SCHEME)
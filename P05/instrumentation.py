@@ -0,0 +1,124 @@
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Spans are mostly sub-millisecond cache hits, so the buckets start much lower than the server's
+SPAN_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+
+
+class _Span:
+    __slots__ = ('count', 'total', 'max', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * len(SPAN_BUCKETS)
+
+
+class Instrumentation:
+    """
+    Opt-in timing spans and event counters for the planner's hot paths. While disabled
+    every hook is a single attribute check; enable it with TRAIN_APP_METRICS=1 or enable().
+    """
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._spans = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def enable(self):
+        self.enabled = True
+
+    def reset(self):
+        with self._lock:
+            self._spans.clear()
+            self._counters.clear()
+
+    def observe(self, name, seconds):
+        with self._lock:
+            span = self._spans.get(name)
+            if span is None:
+                span = self._spans[name] = _Span()
+            span.count += 1
+            span.total += seconds
+            span.max = max(span.max, seconds)
+            for i, bound in enumerate(SPAN_BUCKETS):
+                if seconds <= bound:
+                    span.buckets[i] += 1
+
+    def count(self, name, amount=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    @contextmanager
+    def span(self, name):
+        if not self.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started)
+
+    def timed(self, name):
+        """Decorator recording every call of the function as span `name`."""
+        def decorate(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                started = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.observe(name, time.perf_counter() - started)
+            return wrapper
+        return decorate
+
+    def snapshot(self):
+        """{'spans': {name: {...}}, 'counters': {name: count}} as plain data."""
+        with self._lock:
+            spans = {
+                name: {'count': s.count, 'total_seconds': s.total, 'max_seconds': s.max,
+                       'buckets': list(zip(SPAN_BUCKETS, s.buckets))}
+                for name, s in self._spans.items()
+            }
+            return {'spans': spans, 'counters': dict(self._counters)}
+
+    def summary(self):
+        """Human-readable table, spans ordered by total time spent."""
+        data = self.snapshot()
+        lines = [f"{'span':<36}{'calls':>8}{'total ms':>12}{'mean ms':>10}{'max ms':>10}"]
+        for name, s in sorted(data['spans'].items(), key=lambda item: -item[1]['total_seconds']):
+            lines.append(f"{name:<36}{s['count']:>8}{s['total_seconds'] * 1000:>12.2f}"
+                         f"{s['total_seconds'] * 1000 / s['count']:>10.3f}{s['max_seconds'] * 1000:>10.3f}")
+        if data['counters']:
+            lines.append("")
+            lines.append(f"{'counter':<36}{'count':>8}")
+            lines += [f"{name:<36}{count:>8}" for name, count in sorted(data['counters'].items())]
+        return "\n".join(lines)
+
+    def prometheus_text(self):
+        data = self.snapshot()
+        lines = ["# TYPE train_span_seconds histogram"]
+        for name, s in sorted(data['spans'].items()):
+            # Buckets are already cumulative: observe() counts a span in every bucket it fits
+            for bound, count in s['buckets']:
+                lines.append(f'train_span_seconds_bucket{{span="{name}",le="{bound}"}} {count}')
+            lines += [
+                f'train_span_seconds_bucket{{span="{name}",le="+Inf"}} {s["count"]}',
+                f'train_span_seconds_sum{{span="{name}"}} {s["total_seconds"]}',
+                f'train_span_seconds_count{{span="{name}"}} {s["count"]}',
+            ]
+        lines.append("# TYPE train_events_total counter")
+        lines += [f'train_events_total{{event="{name}"}} {count}' for name, count in sorted(data['counters'].items())]
+        return "\n".join(lines) + "\n"
+
+
+metrics = Instrumentation(enabled=os.environ.get('TRAIN_APP_METRICS', '') not in ('', '0'))
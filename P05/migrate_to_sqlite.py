@@ -0,0 +1,49 @@
+import argparse
+import json
+import os
+
+from storage import SQLiteStorage
+
+
+def migrate(json_file='city_data.json', sqlite_file='city_data.sqlite'):
+    """Copy the cities, train_companies and blacklist tables of a TinyDB file into a new SQLite database."""
+    if os.path.exists(sqlite_file):
+        raise FileExistsError(f"{sqlite_file} already exists; remove it first to re-run the migration.")
+
+    with open(json_file, encoding='utf-8') as f:
+        data = json.load(f)
+
+    # TinyDB stores each table as {"<doc id>": row}; keep the document order
+    def rows(table):
+        docs = data.get(table, {})
+        return [docs[key] for key in sorted(docs, key=int)]
+
+    # Build a temporary file and rename it into place, so a failed migration never leaves a
+    # partial city_data.sqlite that default_db_file() would prefer over the JSON file
+    tmp_file = sqlite_file + ".tmp"
+    try:
+        storage = SQLiteStorage(tmp_file)
+        try:
+            storage.add_cities(rows('cities'))
+            storage.add_train_companies(rows('train_companies'))
+            storage.save_blacklist_entries(rows('blacklist'))
+        finally:
+            storage.close()
+        os.replace(tmp_file, sqlite_file)
+    finally:
+        for name in (tmp_file, tmp_file + "-wal", tmp_file + "-shm"):
+            if os.path.exists(name):
+                os.remove(name)
+
+    counts = {table: len(data.get(table, {})) for table in ('cities', 'train_companies', 'blacklist')}
+    print(f"Migrated {json_file} to {sqlite_file}: "
+          + ", ".join(f"{count} {table}" for table, count in counts.items()))
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrate the TinyDB city database to SQLite.")
+    parser.add_argument('json_file', nargs='?', default='city_data.json')
+    parser.add_argument('sqlite_file', nargs='?', default='city_data.sqlite')
+    args = parser.parse_args()
+    migrate(args.json_file, args.sqlite_file)
@@ -1,52 +1,235 @@
-from tinydb import TinyDB, Query
-import requests
+import argparse
+import asyncio
 import logging
 import json
+import os
+import tempfile
+import time
+
+from http_client import (DEFAULT_RATE_LIMITS, RETRY_STATUSES, TRANSPORT_API_URL, TRANSPORT_HOST, AsyncRateLimiter,
+                         backoff_delay, get_client)
+from storage import default_db_file, open_storage
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 
-# DB setup
-db = TinyDB('city_data.json')
-city_table = db.table('cities')
-City = Query()
+# Same database as train.py: city_data.sqlite once migrated, city_data.json otherwise
+_storage = None
 
 # Define your home location
 FROM_CITY = "Zurich"
 
+# Entries older than this are re-checked in incremental mode
+SNAPSHOT_TTL = 7 * 24 * 3600
+
+CONNECTIONS_URL = f"{TRANSPORT_API_URL}/connections"
+
+
 def is_reachable(from_city, to_city):
+    """True or False, or None if the check itself failed (network error, 429/5xx after retries)."""
     try:
-        response = requests.get("http://transport.opendata.ch/v1/connections", params={"from": from_city, "to": to_city}, timeout=15)
+        response = get_client().get(CONNECTIONS_URL, params={"from": from_city, "to": to_city})
+        if response.status_code >= 400:
+            logging.warning("Failed to check %s → %s: HTTP %s", from_city, to_city, response.status_code)
+            return None
         data = response.json()
         return bool(data.get("connections"))
     except Exception as e:
-        logging.warning(f"Failed to check {from_city} → {to_city}: {e}")
-        return False
+        logging.warning("Failed to check %s → %s: %s", from_city, to_city, e)
+        return None
+
+
+def _snapshot_entry(start_city, city, reachable, previous=None):
+    """
+    Snapshot entry for a finished check. A failed check (reachable None) keeps the
+    previous entry, or leaves checked_at out, so the next incremental run checks again
+    instead of pinning an outage as unreachable for the whole TTL.
+    """
+    if reachable is None and previous is not None:
+        return previous
+    entry = {
+        "from": start_city,
+        "to": city['name'],
+        "reachable": reachable,
+        "latitude": city['latitude'],
+        "longitude": city['longitude'],
+    }
+    if reachable is not None:
+        entry["checked_at"] = int(time.time())
+    return entry
+
+
+def all_cities():
+    global _storage
+    if _storage is None:
+        _storage = open_storage(default_db_file())
+    return _storage.get_all_cities()
+
+
+def _destinations(start_city):
+    return [city for city in all_cities() if city['name'].lower() != start_city.lower()]
+
+
+def _snapshot_file(start_city):
+    return f"reachability_from_{start_city.lower()}.json"
+
+
+def _load_snapshot(start_city):
+    try:
+        with open(_snapshot_file(start_city), encoding="utf-8") as f:
+            return {entry['to']: entry for entry in json.load(f)}
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _plan_snapshot(start_city, incremental=False, ttl=SNAPSHOT_TTL):
+    """
+    Return (entries, stale) for start_city. entries follows table order and holds the
+    reusable previous result or None; stale lists the (position, city, previous entry)
+    triples to check. Without incremental every destination is stale.
+    """
+    previous = _load_snapshot(start_city) if incremental else {}
+    now = time.time()
+    entries, stale = [], []
+    for city in _destinations(start_city):
+        entry = previous.get(city['name'])
+        if (entry is None or entry.get('checked_at', 0) + ttl <= now
+                or (entry['latitude'], entry['longitude']) != (city['latitude'], city['longitude'])):
+            stale.append((len(entries), city, entry))
+            entry = None
+        entries.append(entry)
+    if incremental:
+        logging.info("%s: reusing %d entries, checking %d", start_city, len(entries) - len(stale), len(stale))
+    return entries, stale
+
+
+def _write_snapshot(start_city, results):
+    # Write to a temporary file next to the target and rename, so readers never see a partial file
+    path = _snapshot_file(start_city)
+    fd, tmp_path = tempfile.mkstemp(prefix=path + ".", suffix=".tmp", dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+    logging.info("Saved reachability snapshot to %s", path)
+
 
 # New function for generating snapshot file
-def update_reachability_snapshot(start_city="Zurich"):
-    cities = city_table.all()
-    results = []
-
-    for city in cities:
-        to_city = city['name']
-        if to_city.lower() == start_city.lower():
-            continue
-
-        print(f"Checking: {to_city}...", flush=True)
-        reachable = is_reachable(start_city, to_city)
-        results.append({
-            "from": start_city,
-            "to": to_city,
-            "reachable": reachable,
-            "latitude": city['latitude'],
-            "longitude": city['longitude']
-        })
-
-    with open(f"reachability_from_{start_city.lower()}.json", "w", encoding="utf-8") as f:
-        json.dump(results, f, indent=2, ensure_ascii=False)
-
-    logging.info(f"Saved reachability snapshot to reachability_from_{start_city.lower()}.json")
-
-# Run it
-update_reachability_snapshot(FROM_CITY)
\ No newline at end of file
+def update_reachability_snapshot(start_city="Zurich", incremental=False, ttl=SNAPSHOT_TTL):
+    results, stale = _plan_snapshot(start_city, incremental, ttl)
+
+    for i, city, previous in stale:
+        print(f"Checking: {city['name']}...", flush=True)
+        reachable = is_reachable(start_city, city['name'])
+        results[i] = _snapshot_entry(start_city, city, reachable, previous)
+
+    _write_snapshot(start_city, results)
+
+
+async def fetch_connections_async(session, limiter, from_city, to_city, fields=None):
+    """Return the connections list for from_city -> to_city, or None if the request failed."""
+    import aiohttp
+
+    client = get_client()
+    params = {"from": from_city, "to": to_city}
+    if fields:
+        params["fields[]"] = fields
+    for attempt in range(client.max_retries + 1):
+        await limiter.wait()
+        try:
+            async with session.get(CONNECTIONS_URL, params=params) as response:
+                if response.status in RETRY_STATUSES and attempt < client.max_retries:
+                    await asyncio.sleep(backoff_delay(attempt, client.backoff, client.max_backoff))
+                    continue
+                if response.status >= 400:
+                    logging.warning("Failed to check %s → %s: HTTP %s", from_city, to_city, response.status)
+                    return None
+                data = await response.json(content_type=None)
+                return data.get("connections") or []
+        except (asyncio.TimeoutError, OSError, aiohttp.ClientError) as e:
+            # ClientError covers ServerDisconnectedError and ClientPayloadError, which are not OSErrors
+            if attempt == client.max_retries:
+                logging.warning("Failed to check %s → %s: %s", from_city, to_city, e)
+                return None
+            await asyncio.sleep(backoff_delay(attempt, client.backoff, client.max_backoff))
+        except Exception as e:
+            logging.warning("Failed to check %s → %s: %s", from_city, to_city, e)
+            return None
+    return None
+
+
+async def is_reachable_async(session, limiter, from_city, to_city):
+    """True or False, or None if the check failed."""
+    connections = await fetch_connections_async(session, limiter, from_city, to_city)
+    return None if connections is None else bool(connections)
+
+
+def open_session(concurrency):
+    """aiohttp session configured with the shared client's timeouts and a connection limit."""
+    import aiohttp
+
+    connect_timeout, read_timeout = get_client().timeout
+    timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    return aiohttp.ClientSession(timeout=timeout, connector=connector, headers={'User-Agent': "train_app"})
+
+
+async def build_reachability_snapshots(start_cities, concurrency=16, rate=None, incremental=False, ttl=SNAPSHOT_TTL):
+    """
+    Check every (start city, destination) pair concurrently, with at most `concurrency`
+    requests in flight and at most `rate` requests per second to the transport API.
+    With incremental, only stale or new destinations are checked.
+    Returns {start_city: [snapshot entries]} in table order.
+    """
+    limiter = AsyncRateLimiter(rate if rate is not None else DEFAULT_RATE_LIMITS[TRANSPORT_HOST])
+    semaphore = asyncio.Semaphore(concurrency)
+    snapshots = {}
+    jobs = []
+    for start_city in start_cities:
+        snapshots[start_city], stale = _plan_snapshot(start_city, incremental, ttl)
+        jobs.extend((start_city, i, city, previous) for i, city, previous in stale)
+    done = 0
+
+    async with open_session(concurrency) as session:
+        async def run(start_city, i, city, previous):
+            nonlocal done
+            async with semaphore:
+                reachable = await is_reachable_async(session, limiter, start_city, city['name'])
+            snapshots[start_city][i] = _snapshot_entry(start_city, city, reachable, previous)
+            done += 1
+            status = 'check failed' if reachable is None else 'reachable' if reachable else 'unreachable'
+            print(f"[{done}/{len(jobs)}] {start_city} → {city['name']}: {status}", flush=True)
+
+        await asyncio.gather(*(run(*job) for job in jobs))
+
+    return snapshots
+
+
+def update_reachability_snapshots_async(start_cities=(FROM_CITY,), concurrency=16, rate=None, incremental=False, ttl=SNAPSHOT_TTL):
+    snapshots = asyncio.run(build_reachability_snapshots(list(start_cities), concurrency, rate, incremental, ttl))
+    for start_city, results in snapshots.items():
+        _write_snapshot(start_city, results)
+    return snapshots
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate reachability_from_<city>.json snapshots.")
+    parser.add_argument('start_cities', nargs='*', default=[FROM_CITY], help="origin cities (default: Zurich)")
+    parser.add_argument('--async', dest='use_async', action='store_true', help="check destinations concurrently")
+    parser.add_argument('--concurrency', type=int, default=16, help="max requests in flight in --async mode")
+    parser.add_argument('--rate', type=float, default=None, help="max requests per second in --async mode")
+    parser.add_argument('--incremental', action='store_true', help="only re-check stale or new destinations")
+    parser.add_argument('--ttl', type=float, default=SNAPSHOT_TTL / 3600, help="hours before an entry is stale (default: 168)")
+    args = parser.parse_args()
+    ttl = args.ttl * 3600
+
+    # Run it
+    if args.use_async:
+        update_reachability_snapshots_async(args.start_cities, args.concurrency, args.rate, args.incremental, ttl)
+    else:
+        for start_city in args.start_cities:
+            update_reachability_snapshot(start_city, args.incremental, ttl)
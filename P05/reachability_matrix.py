@@ -0,0 +1,201 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import struct
+
+import numpy as np
+
+from connection import parse_duration_minutes
+from http_client import DEFAULT_RATE_LIMITS, TRANSPORT_HOST, AsyncRateLimiter
+
+MATRIX_FILE = "reachability_matrix.bin"
+
+# File layout (little endian): header, city list as JSON, bit-packed reachability
+# (row-major, one bit per pair) and uint16 durations in minutes, each section
+# aligned to 8 bytes so the arrays can be memory-mapped in place.
+_MAGIC = b"RMAT"
+_VERSION = 1
+_HEADER = struct.Struct("<4sHxxII")  # magic, version, city count, city JSON length
+_ALIGN = 8
+
+NO_DURATION = 0xFFFF  # unreachable, or the duration is unknown
+
+
+def _aligned(offset):
+    return (offset + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+class ReachabilityMatrix:
+    """
+    N x N reachability and duration matrix over the cities table. Rows are origins,
+    columns destinations; cities can be looked up by 'city' or station 'name'.
+    """
+    def __init__(self, cities, packed_reachable, durations):
+        self.cities = cities
+        self.size = len(cities)
+        self._packed = packed_reachable
+        self.durations = durations.reshape(self.size, self.size)
+        self._index = {}
+        for i, city in enumerate(cities):
+            self._index.setdefault(city['name'].lower(), i)
+            self._index.setdefault(city['city'].lower(), i)
+
+    @classmethod
+    def from_dense(cls, cities, reachable, durations):
+        reachable = np.asarray(reachable, dtype=bool)
+        packed = np.packbits(reachable.ravel(), bitorder='little')
+        return cls(cities, packed, np.asarray(durations, dtype='<u2'))
+
+    def index_of(self, city):
+        index = self._index.get(city.lower())
+        if index is None:
+            raise KeyError(f"{city} is not in the reachability matrix")
+        return index
+
+    def _bit(self, i, j):
+        k = i * self.size + j
+        return bool((self._packed[k >> 3] >> (k & 7)) & 1)
+
+    def is_reachable(self, from_city, to_city):
+        return self._bit(self.index_of(from_city), self.index_of(to_city))
+
+    def duration(self, from_city, to_city):
+        """Fastest known duration in minutes, or None."""
+        minutes = int(self.durations[self.index_of(from_city), self.index_of(to_city)])
+        return None if minutes == NO_DURATION else minutes
+
+    def reachable_mask(self):
+        """Dense N x N boolean array (unpacks the bit matrix)."""
+        bits = np.unpackbits(self._packed, count=self.size * self.size, bitorder='little')
+        return bits.reshape(self.size, self.size).astype(bool)
+
+    def reachable_from(self, from_city):
+        i = self.index_of(from_city)
+        row = np.unpackbits(self._packed, count=(i + 1) * self.size, bitorder='little')[i * self.size:]
+        return [self.cities[j] for j in np.flatnonzero(row) if j != i]
+
+    def save(self, path=MATRIX_FILE):
+        city_json = json.dumps(self.cities, ensure_ascii=False).encode('utf-8')
+        bits_offset = _aligned(_HEADER.size + len(city_json))
+        durations_offset = _aligned(bits_offset + len(self._packed))
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, _VERSION, self.size, len(city_json)))
+            f.write(city_json)
+            f.seek(bits_offset)
+            f.write(np.asarray(self._packed, dtype=np.uint8).tobytes())
+            f.seek(durations_offset)
+            f.write(np.ascontiguousarray(self.durations, dtype='<u2').tobytes())
+        os.replace(tmp_path, path)
+        logging.info("Saved %dx%d reachability matrix to %s", self.size, self.size, path)
+
+    @classmethod
+    def load(cls, path=MATRIX_FILE, mmap=True):
+        with open(path, "rb") as f:
+            magic, version, size, json_length = _HEADER.unpack(f.read(_HEADER.size))
+            if magic != _MAGIC or version != _VERSION:
+                raise ValueError(f"{path} is not a version {_VERSION} reachability matrix")
+            cities = json.loads(f.read(json_length).decode('utf-8'))
+
+        packed_length = (size * size + 7) // 8
+        bits_offset = _aligned(_HEADER.size + json_length)
+        durations_offset = _aligned(bits_offset + packed_length)
+        if mmap:
+            packed = np.memmap(path, dtype=np.uint8, mode='r', offset=bits_offset, shape=(packed_length,))
+            durations = np.memmap(path, dtype='<u2', mode='r', offset=durations_offset, shape=(size * size,))
+        else:
+            packed = np.fromfile(path, dtype=np.uint8, count=packed_length, offset=bits_offset)
+            durations = np.fromfile(path, dtype='<u2', count=size * size, offset=durations_offset)
+        return cls(cities, packed, durations)
+
+
+def _fastest_minutes(connections):
+    best = None
+    for conn in connections:
+        minutes = parse_duration_minutes(conn.get('duration'))
+        if minutes is not None:
+            best = minutes if best is None else min(best, minutes)
+    return best
+
+
+async def build_matrix(concurrency=16, rate=None, retry_rounds=2, retry_delay=30):
+    """
+    Query every ordered pair of cities in the table and return a ReachabilityMatrix.
+    Pairs whose check failed (as opposed to finding no connection) are retried in up to
+    `retry_rounds` further passes, `retry_delay` seconds apart; if any still fail,
+    RuntimeError is raised rather than saving an outage as "no route".
+    """
+    import reachability  # configures logging on import
+
+    cities = [{'city': c['city'], 'name': c['name'], 'latitude': c['latitude'], 'longitude': c['longitude']}
+              for c in reachability.all_cities()]
+    size = len(cities)
+    reachable = np.eye(size, dtype=bool)
+    durations = np.full((size, size), NO_DURATION, dtype='<u2')
+    np.fill_diagonal(durations, 0)
+
+    limiter = AsyncRateLimiter(rate if rate is not None else DEFAULT_RATE_LIMITS[TRANSPORT_HOST])
+    semaphore = asyncio.Semaphore(concurrency)
+    failed = np.zeros((size, size), dtype=bool)
+    pairs = [(i, j) for i in range(size) for j in range(size) if i != j]
+
+    async with reachability.open_session(concurrency) as session:
+        async def run(i, j):
+            nonlocal done
+            async with semaphore:
+                connections = await reachability.fetch_connections_async(
+                    session, limiter, cities[i]['name'], cities[j]['name'], fields=['connections/duration'])
+            failed[i, j] = connections is None
+            if connections:
+                reachable[i, j] = True
+                minutes = _fastest_minutes(connections)
+                if minutes is not None:
+                    durations[i, j] = min(minutes, NO_DURATION - 1)
+            done += 1
+            if done % 100 == 0 or done == len(pairs):
+                print(f"[{done}/{len(pairs)}] pairs checked", flush=True)
+
+        for round_number in range(retry_rounds + 1):
+            if round_number:
+                logging.warning("Retrying %d failed pairs in %d s", len(pairs), retry_delay)
+                await asyncio.sleep(retry_delay)
+            done = 0
+            await asyncio.gather(*(run(i, j) for i, j in pairs))
+            pairs = [(int(i), int(j)) for i, j in zip(*np.nonzero(failed))]
+            if not pairs:
+                break
+
+    if pairs:
+        raise RuntimeError(f"{len(pairs)} city pairs could not be checked; not building an incomplete matrix")
+    return ReachabilityMatrix.from_dense(cities, reachable, durations)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or query the all-pairs reachability matrix.")
+    parser.add_argument('--file', default=MATRIX_FILE)
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help="query every city pair and write the matrix file")
+    build.add_argument('--concurrency', type=int, default=16)
+    build.add_argument('--rate', type=float, default=None, help="max requests per second")
+    build.add_argument('--retry-rounds', type=int, default=2, help="extra passes over pairs whose check failed")
+    query = commands.add_parser('query', help="look up one pair")
+    query.add_argument('from_city')
+    query.add_argument('to_city')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        try:
+            matrix = asyncio.run(build_matrix(args.concurrency, args.rate, args.retry_rounds))
+        except RuntimeError as e:
+            # Keep the previous matrix file rather than replacing it with outage results
+            logging.error("%s", e)
+            raise SystemExit(1)
+        matrix.save(args.file)
+    else:
+        matrix = ReachabilityMatrix.load(args.file)
+        minutes = matrix.duration(args.from_city, args.to_city)
+        print(f"{args.from_city} → {args.to_city}: "
+              f"{'reachable' if matrix.is_reachable(args.from_city, args.to_city) else 'unreachable'}"
+              + (f", {minutes // 60}h {minutes % 60}m" if minutes is not None else ""))
@@ -0,0 +1,113 @@
+import argparse
+import heapq
+
+import numpy as np
+
+from distance_engine import BatchDistanceEngine
+from reachability_matrix import MATRIX_FILE, NO_DURATION, ReachabilityMatrix
+
+# Faster than any train in the network, so the time estimate never overshoots (A* stays exact)
+MAX_SPEED_KMH = 320
+TRANSFER_MINUTES = 10
+
+
+class RoutePlanner:
+    """
+    A* search over the cities of a ReachabilityMatrix. Edge weights are the cached
+    fastest durations; the heuristic is the straight-line distance at MAX_SPEED_KMH.
+    """
+    def __init__(self, matrix, transfer_minutes=TRANSFER_MINUTES):
+        self.matrix = matrix
+        self.transfer_minutes = transfer_minutes
+        self.engine = BatchDistanceEngine(matrix.cities)
+        # Adjacency lists built once: node -> [(neighbour, minutes)]
+        durations = np.asarray(matrix.durations)
+        known = (durations != NO_DURATION) & matrix.reachable_mask()
+        np.fill_diagonal(known, False)
+        self.adjacency = [
+            [(int(j), int(durations[i, j])) for j in np.flatnonzero(known[i])]
+            for i in range(matrix.size)
+        ]
+
+    @classmethod
+    def from_file(cls, path=MATRIX_FILE, **kwargs):
+        return cls(ReachabilityMatrix.load(path), **kwargs)
+
+    def __contains__(self, city):
+        try:
+            self.matrix.index_of(city)
+        except KeyError:
+            return False
+        return True
+
+    def plan(self, from_city, to_city):
+        """
+        Return the fastest itinerary as {'legs': [...], 'total_minutes', 'transfers'},
+        or None if to_city cannot be reached. Each leg has 'from', 'to' and 'duration_minutes'.
+        """
+        source = self.matrix.index_of(from_city)
+        target = self.matrix.index_of(to_city)
+        if source == target:
+            return {'legs': [], 'total_minutes': 0, 'transfers': 0}
+
+        target_city = self.matrix.cities[target]
+        heuristic = self.engine.distances_from((target_city['latitude'], target_city['longitude'])) / MAX_SPEED_KMH * 60
+
+        best = {source: 0}
+        previous = {}
+        queue = [(heuristic[source], 0, source)]
+        while queue:
+            _, cost, node = heapq.heappop(queue)
+            if node == target:
+                return self._itinerary(previous, source, target)
+            if cost > best[node]:
+                continue
+            # Changing trains costs time everywhere except at the start
+            penalty = self.transfer_minutes if node != source else 0
+            for neighbour, minutes in self.adjacency[node]:
+                new_cost = cost + penalty + minutes
+                if new_cost < best.get(neighbour, float('inf')):
+                    best[neighbour] = new_cost
+                    previous[neighbour] = node
+                    heapq.heappush(queue, (new_cost + heuristic[neighbour], new_cost, neighbour))
+        return None
+
+    def _itinerary(self, previous, source, target):
+        path = [target]
+        while path[-1] != source:
+            path.append(previous[path[-1]])
+        path.reverse()
+
+        durations = self.matrix.durations
+        legs = [
+            {
+                'from': self.matrix.cities[a]['name'],
+                'to': self.matrix.cities[b]['name'],
+                'duration_minutes': int(durations[a, b]),
+            }
+            for a, b in zip(path, path[1:])
+        ]
+        transfers = len(legs) - 1
+        total = sum(leg['duration_minutes'] for leg in legs) + transfers * self.transfer_minutes
+        return {'legs': legs, 'total_minutes': total, 'transfers': transfers}
+
+
+def format_itinerary(itinerary):
+    lines = []
+    for leg in itinerary['legs']:
+        minutes = leg['duration_minutes']
+        lines.append(f"{leg['from']} → {leg['to']}\t{minutes // 60}h {minutes % 60}m")
+    total = itinerary['total_minutes']
+    lines.append(f"Total: {total // 60}h {total % 60}m with {itinerary['transfers']} transfer(s)")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plan a multi-leg journey from the cached reachability matrix.")
+    parser.add_argument('from_city')
+    parser.add_argument('to_city')
+    parser.add_argument('--file', default=MATRIX_FILE)
+    args = parser.parse_args()
+
+    itinerary = RoutePlanner.from_file(args.file).plan(args.from_city, args.to_city)
+    print(format_itinerary(itinerary) if itinerary else f"No route found from {args.from_city} to {args.to_city}.")
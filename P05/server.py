@@ -0,0 +1,167 @@
+import argparse
+import asyncio
+import functools
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web
+
+from db_initializer import DatabaseInitializer
+from instrumentation import metrics
+from storage import default_db_file
+from train import InputValidator, TrainApp
+
+ENDPOINTS = ('/plan', '/metrics', '/health')
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class JourneyService:
+    """
+    Keeps one warm TrainApp per process and plans journeys on a thread pool.
+    Identical queries that arrive while one is in flight share its result.
+    """
+    def __init__(self, app, workers=16):
+        self.app = app
+        self.app.transport_service.verbose = False
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self._in_flight = {}
+        self.requests = {}  # (endpoint, status) -> count
+        self.coalesced = 0
+        self.latency_buckets = [0] * len(LATENCY_BUCKETS)
+        self.latency_sum = 0.0
+        self.latency_count = 0
+
+    async def plan(self, start_city, end_city):
+        key = (start_city.casefold(), end_city.casefold())
+        task = self._in_flight.get(key)
+        if task is None:
+            loop = asyncio.get_running_loop()
+            task = loop.run_in_executor(self.executor, self.app.plan_journey, start_city, end_city)
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        else:
+            self.coalesced += 1
+        # shield: a client hanging up must not cancel a plan other clients are waiting for
+        return await asyncio.shield(task)
+
+    def observe(self, endpoint, status, seconds):
+        self.requests[(endpoint, status)] = self.requests.get((endpoint, status), 0) + 1
+        if endpoint != '/plan':
+            return
+        self.latency_sum += seconds
+        self.latency_count += 1
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.latency_buckets[i] += 1
+
+    def metrics_text(self):
+        lines = [
+            "# TYPE train_http_requests_total counter",
+            *(f'train_http_requests_total{{endpoint="{endpoint}",status="{status}"}} {count}'
+              for (endpoint, status), count in sorted(self.requests.items())),
+            "# TYPE train_plan_coalesced_total counter",
+            f"train_plan_coalesced_total {self.coalesced}",
+            "# TYPE train_plan_in_flight gauge",
+            f"train_plan_in_flight {len(self._in_flight)}",
+            "# TYPE train_plan_latency_seconds histogram",
+            *(f'train_plan_latency_seconds_bucket{{le="{bound}"}} {count}'
+              for bound, count in zip(LATENCY_BUCKETS, self.latency_buckets)),
+            f'train_plan_latency_seconds_bucket{{le="+Inf"}} {self.latency_count}',
+            f"train_plan_latency_seconds_sum {self.latency_sum}",
+            f"train_plan_latency_seconds_count {self.latency_count}",
+        ]
+        geocode = self.app.geo_service.cache.stats()
+        connections = self.app.transport_service.cache.stats()
+        lines += [
+            "# TYPE train_geocode_cache_hits_total counter",
+            f"train_geocode_cache_hits_total {geocode['hits']}",
+            "# TYPE train_geocode_cache_misses_total counter",
+            f"train_geocode_cache_misses_total {geocode['misses']}",
+            "# TYPE train_geocode_coalesced_total counter",
+            f"train_geocode_coalesced_total {self.app.geo_service.flight.coalesced}",
+            "# TYPE train_connection_cache_hits_total counter",
+            f'train_connection_cache_hits_total{{state="fresh"}} {connections["hits"]}',
+            f'train_connection_cache_hits_total{{state="stale"}} {connections["stale_hits"]}',
+            "# TYPE train_connection_cache_misses_total counter",
+            f"train_connection_cache_misses_total {connections['misses']}",
+            "# TYPE train_blacklist_entries gauge",
+            f"train_blacklist_entries {len(self.app.database.blacklist)}",
+        ]
+        text = "\n".join(lines) + "\n"
+        if metrics.enabled:
+            text += metrics.prometheus_text()
+        return text
+
+
+@web.middleware
+async def observe_requests(request, handler):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await handler(request)
+        status = response.status
+        return response
+    except web.HTTPException as e:
+        status = e.status
+        raise
+    finally:
+        # Unknown paths share one label so scanners cannot blow up the metric cardinality
+        endpoint = request.path if request.path in ENDPOINTS else 'other'
+        request.app['service'].observe(endpoint, status, time.perf_counter() - started)
+
+
+async def handle_plan(request):
+    start_city = request.query.get('from', '')
+    end_city = request.query.get('to', '')
+    if not (InputValidator.is_valid_city_name(start_city) and InputValidator.is_valid_city_name(end_city)):
+        return web.json_response({'status': 'error', 'error': "Query parameters 'from' and 'to' must be valid city names."}, status=400)
+    service = request.app['service']
+    start_city, end_city = start_city.strip(), end_city.strip()
+    try:
+        result = await service.plan(start_city, end_city)
+    except Exception as e:
+        # Geocoder or transport API failures; answer in the same shape as batch mode
+        service.app.logger.error("Failed to plan %s to %s: %s", start_city, end_city, e)
+        return web.json_response({'from': start_city, 'to': end_city, 'status': 'error', 'error': str(e)},
+                                 status=502, dumps=functools.partial(json.dumps, ensure_ascii=False))
+    return web.json_response(result, dumps=functools.partial(json.dumps, ensure_ascii=False))
+
+
+async def handle_metrics(request):
+    return web.Response(text=request.app['service'].metrics_text(), content_type='text/plain', charset='utf-8')
+
+
+async def handle_health(request):
+    return web.json_response({'status': 'ok'})
+
+
+def create_app(train_app, workers=16):
+    app = web.Application(middlewares=[observe_requests])
+    app['service'] = JourneyService(train_app, workers)
+    app.router.add_get('/plan', handle_plan)
+    app.router.add_get('/metrics', handle_metrics)
+    app.router.add_get('/health', handle_health)
+
+    async def shutdown_service(app):
+        app['service'].app.database.blacklist.flush()
+        app['service'].executor.shutdown(wait=False)
+
+    app.on_cleanup.append(shutdown_service)
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve journey planning over HTTP.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--workers', type=int, default=16, help="threads planning journeys")
+    args = parser.parse_args()
+
+    # Prefer the SQLite database once city_data.json has been migrated
+    db_file = default_db_file()
+    if not os.path.exists(db_file):
+        print(f"Database file {db_file} not found. Initializing database...")
+        DatabaseInitializer(db_file).initialize_database()
+    web.run_app(create_app(TrainApp(db_file), args.workers), host=args.host, port=args.port)
@@ -0,0 +1,117 @@
+import math
+
+EARTH_RADIUS_KM = 6371.0088  # same mean radius as the haversine package
+
+
+def to_unit_vector(lat, lon):
+    phi = math.radians(lat)
+    lam = math.radians(lon)
+    cos_phi = math.cos(phi)
+    return cos_phi * math.cos(lam), cos_phi * math.sin(lam), math.sin(phi)
+
+
+def chord_to_km(chord):
+    """Convert a straight-line distance on the unit sphere to a great-circle distance in km."""
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, chord / 2))
+
+
+def haversine_km(start_coords, end_coords):
+    """Great-circle distance in km; matches haversine.haversine without importing numpy."""
+    lat1, lon1 = map(math.radians, start_coords)
+    lat2, lon2 = map(math.radians, end_coords)
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def initial_bearing(start_coords, end_coords):
+    """Compass bearing in degrees (0-360) when leaving start_coords towards end_coords."""
+    lat1, lon1 = map(math.radians, start_coords)
+    lat2, lon2 = map(math.radians, end_coords)
+    d_lon = lon2 - lon1
+    x = math.sin(d_lon) * math.cos(lat2)
+    y = math.cos(lat1) * math.sin(lat2) - math.sin(lat1) * math.cos(lat2) * math.cos(d_lon)
+    return math.degrees(math.atan2(x, y)) % 360
+
+
+def bearing_difference(a, b):
+    diff = abs(a - b) % 360
+    return min(diff, 360 - diff)
+
+
+class _Node:
+    __slots__ = ('point', 'index', 'axis', 'left', 'right')
+
+    def __init__(self, point, index, axis, left, right):
+        self.point = point
+        self.index = index
+        self.axis = axis
+        self.left = left
+        self.right = right
+
+
+class CityIndex:
+    """
+    In-memory k-d tree over the cities table, using 3D unit-sphere coordinates so
+    that the nearest point by chord length is also the nearest by great-circle distance.
+    """
+    def __init__(self, cities):
+        self.cities = list(cities)
+        points = [(to_unit_vector(city['latitude'], city['longitude']), i) for i, city in enumerate(self.cities)]
+        self._root = self._build(points, 0)
+
+    def __len__(self):
+        return len(self.cities)
+
+    def _build(self, points, depth):
+        if not points:
+            return None
+        axis = depth % 3
+        points.sort(key=lambda p: p[0][axis])
+        mid = len(points) // 2
+        point, index = points[mid]
+        return _Node(point, index, axis,
+                     self._build(points[:mid], depth + 1),
+                     self._build(points[mid + 1:], depth + 1))
+
+    def nearest(self, coords, predicate=None):
+        """
+        Return (city, distance_km) of the city closest to coords, or (None, None).
+        If given, predicate(city) must be true for a city to be considered.
+        """
+        if self._root is None:
+            return None, None
+        target = to_unit_vector(*coords)
+        best_dist_sq, best_index = float('inf'), None
+        stack = [(self._root, 0.0)]
+        # Iterative depth-first search, nearer child first; a far child is skipped
+        # once the splitting plane is further away than the best match so far
+        while stack:
+            node, plane_dist_sq = stack.pop()
+            if node is None or plane_dist_sq >= best_dist_sq:
+                continue
+            px, py, pz = node.point
+            dist_sq = (px - target[0]) ** 2 + (py - target[1]) ** 2 + (pz - target[2]) ** 2
+            if dist_sq < best_dist_sq and (predicate is None or predicate(self.cities[node.index])):
+                best_dist_sq, best_index = dist_sq, node.index
+
+            delta = target[node.axis] - node.point[node.axis]
+            near, far = (node.left, node.right) if delta < 0 else (node.right, node.left)
+            stack.append((far, delta * delta))
+            stack.append((near, 0.0))
+
+        if best_index is None:
+            return None, None
+        return self.cities[best_index], chord_to_km(math.sqrt(best_dist_sq))
+
+    def nearest_in_cone(self, start_coords, end_coords, max_angle):
+        """
+        Return (city, distance_km) of the city closest to end_coords whose bearing seen
+        from start_coords is within max_angle degrees of the start -> end bearing.
+        """
+        heading = initial_bearing(start_coords, end_coords)
+
+        def in_cone(city):
+            bearing = initial_bearing(start_coords, (city['latitude'], city['longitude']))
+            return bearing_difference(bearing, heading) <= max_angle
+
+        return self.nearest(end_coords, in_cone)
@@ -0,0 +1,251 @@
+import os
+import sqlite3
+import threading
+
+SQLITE_EXTENSIONS = ('.sqlite', '.sqlite3', '.db')
+JSON_DB_FILE = 'city_data.json'
+SQLITE_DB_FILE = 'city_data.sqlite'
+
+
+class TinyDBStorage:
+    """
+    The original JSON storage; every query scans the table and every write rewrites the file.
+    TinyDB shares one file handle between reads and writes, so every call holds _lock.
+    """
+    def __init__(self, db_file='city_data.json'):
+        from tinydb import TinyDB, Query
+
+        self.Query = Query
+        self.db_file = db_file
+        self._lock = threading.Lock()
+        self.db = TinyDB(db_file)
+        self.city_table = self.db.table('cities')
+        self.company_table = self.db.table('train_companies')
+        self.blacklist_table = self.db.table('blacklist')
+        # See version(): bumped when the file changes other than through our own non-city writes
+        self._cities_version = 0
+        self._seen_stat = self._stat()
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.db_file)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _other_table_written(self):
+        # Called with _lock held: our blacklist and company writes must not look like a cities change
+        self._seen_stat = self._stat()
+
+    def is_blacklisted(self, from_city, to_city):
+        BlacklistQuery = self.Query()
+        with self._lock:
+            return self.blacklist_table.contains((BlacklistQuery.from_city == from_city) & (BlacklistQuery.to_city == to_city))
+
+    def add_to_blacklist(self, from_city, to_city):
+        with self._lock:
+            self.blacklist_table.insert({'from_city': from_city, 'to_city': to_city})
+            self._other_table_written()
+
+    def get_blacklist(self):
+        with self._lock:
+            return self.blacklist_table.all()
+
+    def save_blacklist_entries(self, rows):
+        """Insert or replace blacklist rows ({'from_city', 'to_city', 'added_at'}) with two file writes."""
+        pairs = {(row['from_city'], row['to_city']) for row in rows}
+        with self._lock:
+            if pairs:
+                self.blacklist_table.remove(lambda row: (row['from_city'], row['to_city']) in pairs)
+            self.blacklist_table.insert_multiple(rows)
+            self._other_table_written()
+
+    def remove_blacklist_entries(self, pairs):
+        pairs = set(pairs)
+        if pairs:
+            with self._lock:
+                self.blacklist_table.remove(lambda row: (row['from_city'], row['to_city']) in pairs)
+                self._other_table_written()
+
+    def get_all_cities(self):
+        with self._lock:
+            return self.city_table.all()
+
+    def get_train_company(self, country):
+        Company = self.Query()
+        with self._lock:
+            result = self.company_table.search(Company.country == country)
+        if result:
+            return result[0]['url']
+        return None
+
+    def get_train_companies(self):
+        with self._lock:
+            return self.company_table.all()
+
+    def add_cities(self, rows):
+        with self._lock:
+            self.city_table.insert_multiple(rows)
+
+    def add_train_companies(self, rows):
+        with self._lock:
+            self.company_table.insert_multiple(rows)
+            self._other_table_written()
+
+    def version(self):
+        """
+        Changes when the cities table may have changed. TinyDB rewrites the whole file on
+        every write, so any change of its stat that did not come from this object's own
+        blacklist writes (the initializer, another process) counts as a cities change.
+        """
+        with self._lock:
+            stat = self._stat()
+            if stat != self._seen_stat:
+                self._seen_stat = stat
+                self._cities_version += 1
+            return self._cities_version
+
+    def close(self):
+        with self._lock:
+            self.db.close()
+
+
+class SQLiteStorage:
+    """Indexed SQLite storage with the same tables and row shapes as the TinyDB file."""
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS cities (
+            city TEXT NOT NULL,
+            id TEXT NOT NULL DEFAULT '',
+            name TEXT NOT NULL,
+            latitude REAL NOT NULL,
+            longitude REAL NOT NULL,
+            country TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_cities_city ON cities (city);
+        CREATE INDEX IF NOT EXISTS idx_cities_name ON cities (name);
+        CREATE TABLE IF NOT EXISTS train_companies (
+            country TEXT NOT NULL,
+            url TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_train_companies_country ON train_companies (country);
+        CREATE TABLE IF NOT EXISTS blacklist (
+            from_city TEXT NOT NULL,
+            to_city TEXT NOT NULL,
+            added_at REAL,
+            PRIMARY KEY (from_city, to_city)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        ) WITHOUT ROWID;
+        INSERT OR IGNORE INTO meta (key, value) VALUES ('cities_version', 0);
+        CREATE TRIGGER IF NOT EXISTS cities_version_insert AFTER INSERT ON cities BEGIN
+            UPDATE meta SET value = value + 1 WHERE key = 'cities_version';
+        END;
+        CREATE TRIGGER IF NOT EXISTS cities_version_update AFTER UPDATE ON cities BEGIN
+            UPDATE meta SET value = value + 1 WHERE key = 'cities_version';
+        END;
+        CREATE TRIGGER IF NOT EXISTS cities_version_delete AFTER DELETE ON cities BEGIN
+            UPDATE meta SET value = value + 1 WHERE key = 'cities_version';
+        END;
+    """
+
+    def __init__(self, db_file='city_data.sqlite'):
+        self.db_file = db_file
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_file, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(self.SCHEMA)
+        columns = {row['name'] for row in self._conn.execute("PRAGMA table_info(blacklist)")}
+        if 'added_at' not in columns:
+            self._conn.execute("ALTER TABLE blacklist ADD COLUMN added_at REAL")
+        columns = {row['name'] for row in self._conn.execute("PRAGMA table_info(cities)")}
+        if 'country' not in columns:
+            self._conn.execute("ALTER TABLE cities ADD COLUMN country TEXT")
+        # Not in SCHEMA: files from before the country column only get it from the ALTER above
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_cities_country ON cities (country)")
+        self._conn.commit()
+
+    def is_blacklisted(self, from_city, to_city):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM blacklist WHERE from_city = ? AND to_city = ?", (from_city, to_city)
+            ).fetchone()
+        return row is not None
+
+    def add_to_blacklist(self, from_city, to_city):
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR IGNORE INTO blacklist (from_city, to_city) VALUES (?, ?)", (from_city, to_city))
+
+    def get_blacklist(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT from_city, to_city, added_at FROM blacklist").fetchall()
+        return [dict(row) for row in rows]
+
+    def save_blacklist_entries(self, rows):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO blacklist (from_city, to_city, added_at) VALUES (?, ?, ?)",
+                [(row['from_city'], row['to_city'], row.get('added_at')) for row in rows]
+            )
+
+    def remove_blacklist_entries(self, pairs):
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM blacklist WHERE from_city = ? AND to_city = ?", list(pairs))
+
+    def get_all_cities(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT city, id, name, latitude, longitude, country FROM cities ORDER BY rowid"
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def get_train_company(self, country):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT url FROM train_companies WHERE country = ? ORDER BY rowid LIMIT 1", (country,)
+            ).fetchone()
+        return row['url'] if row else None
+
+    def get_train_companies(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT country, url FROM train_companies ORDER BY rowid").fetchall()
+        return [dict(row) for row in rows]
+
+    def add_cities(self, rows):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO cities (city, id, name, latitude, longitude, country) VALUES (?, ?, ?, ?, ?, ?)",
+                [(row['city'], row.get('id', ''), row['name'], row['latitude'], row['longitude'], row.get('country'))
+                 for row in rows]
+            )
+
+    def add_train_companies(self, rows):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO train_companies (country, url) VALUES (?, ?)",
+                [(row['country'], row['url']) for row in rows]
+            )
+
+    def version(self):
+        # Maintained by triggers on the cities table, so blacklist writes leave it alone
+        # and writes from other connections are seen too
+        with self._lock:
+            return self._conn.execute("SELECT value FROM meta WHERE key = 'cities_version'").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def default_db_file():
+    """city_data.sqlite once city_data.json has been migrated, city_data.json otherwise."""
+    return SQLITE_DB_FILE if os.path.exists(SQLITE_DB_FILE) else JSON_DB_FILE
+
+
+def open_storage(db_file):
+    """Pick the backend from the file extension: SQLite for .sqlite/.sqlite3/.db, TinyDB otherwise."""
+    if db_file.lower().endswith(SQLITE_EXTENSIONS):
+        return SQLiteStorage(db_file)
+    return TinyDBStorage(db_file)
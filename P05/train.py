@@ -1,135 +1,234 @@
+import argparse
+import csv
+import json
 import logging
 import os
-from datetime import datetime
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
-from geopy.geocoders import Nominatim
-from haversine import haversine
-from tinydb import TinyDB, Query
-from db_initializer import DatabaseInitializer
+from batch import read_journeys
+from blacklist import Blacklist
+from connection import CSV_COLUMNS, parse_connections, render_table
+from connection_cache import ConnectionCache
+from country_resolver import CountryResolver
+from geo_cache import GeocodeCache, make_key
+from http_client import NOMINATIM_HOST, TRANSPORT_API_URL, get_client, make_geocoder
+from instrumentation import metrics
+from log_setup import configure_logging
+from singleflight import SingleFlight
+from spatial_index import CityIndex, haversine_km
+from storage import default_db_file, open_storage
 
 
 class Logger:
+    """
+    Thin facade over the 'train_app' logger. Messages take lazy %-style arguments and
+    structured fields via extra=; records are written as JSON by a background thread.
+    """
     def __init__(self):
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(levelname)s - %(message)s',
-            handlers=[
-                logging.FileHandler("train_app.log", encoding='utf-8')
-            ]
-        )
-        self.logger = logging
+        configure_logging()
+        self.logger = logging.getLogger('train_app')
 
-    def info(self, message):
-        self.logger.info(message)
+    def info(self, message, *args, **kwargs):
+        self.logger.info(message, *args, **kwargs)
 
-    def error(self, message):
-        self.logger.error(message)
+    def error(self, message, *args, **kwargs):
+        self.logger.error(message, *args, **kwargs)
 
-    def warning(self, message):
-        self.logger.warning(message)
+    def warning(self, message, *args, **kwargs):
+        self.logger.warning(message, *args, **kwargs)
 
 
 class Database:
-    def __init__(self, db_file='city_data.json'):
+    blacklist_expiry = 7 * 24 * 3600  # seconds before a blacklisted route is queried again
+
+    def __init__(self, db_file='city_data.json', storage=None):
         self.db_file = db_file
-        self.db = TinyDB(db_file)
-        self.city_table = self.db.table('cities')
-        self.company_table = self.db.table('train_companies')
-        self.blacklist_table = self.db.table('blacklist')
+        self.storage = storage or open_storage(db_file)
+        self.blacklist = Blacklist(self.storage, self.blacklist_expiry)
 
+    @metrics.timed('db.is_blacklisted')
     def is_blacklisted(self, from_city, to_city):
-        BlacklistQuery = Query()
-        return self.blacklist_table.contains((BlacklistQuery.from_city == from_city) & (BlacklistQuery.to_city == to_city))
+        return self.blacklist.contains(from_city, to_city)
 
+    @metrics.timed('db.add_to_blacklist')
     def add_to_blacklist(self, from_city, to_city):
-        self.blacklist_table.insert({'from_city': from_city, 'to_city': to_city})
+        self.blacklist.add(from_city, to_city)
 
+    @metrics.timed('db.get_all_cities')
     def get_all_cities(self):
-        return self.city_table.all()
+        return self.storage.get_all_cities()
 
+    def cities_version(self):
+        return self.storage.version()
+
+    @metrics.timed('db.get_train_company')
     def get_train_company(self, country):
-        Company = Query()
-        result = self.company_table.search(Company.country == country)
-        if result:
-            return result[0]['url']
-        return None
+        return self.storage.get_train_company(country)
 
 
 class GeoService:
-    def __init__(self, logger):
-        self.geolocator = Nominatim(user_agent="train_app")
+    def __init__(self, logger, cache=None, http=None):
+        self._geolocator = None
         self.logger = logger
+        self.cache = cache if cache is not None else GeocodeCache()
+        self.http = http or get_client()
+        # Concurrent lookups of the same cache key share one upstream call
+        self.flight = SingleFlight()
+
+    @property
+    def geolocator(self):
+        # geopy is only imported once a lookup actually has to go to Nominatim
+        if self._geolocator is None:
+            self._geolocator = make_geocoder()
+        return self._geolocator
+
+    def _cached(self, key, load):
+        """
+        Return (value, complete) from the cache, or from load() run once across concurrent
+        callers. load returns (value, complete) as well; only complete answers are cached.
+        """
+        kind = key.split('|', 1)[0]
+        found, value = self.cache.lookup(key)
+        if found:
+            metrics.count(f'geocode.{kind}.cache_hit')
+            return value, True
+        metrics.count(f'geocode.{kind}.cache_miss')
+
+        def fill():
+            # A caller that lost the race may find the leader's answer already stored
+            found, value = self.cache.lookup(key)
+            if found:
+                return value, True
+            value, complete = load()
+            if complete:
+                self.cache.set(key, value)
+            return value, complete
+
+        return self.flight.do(key, fill)
+
+    def _geocode(self, city, country=None):
+        # get_country and fetch_coordinates_geopy share one cached Nominatim lookup per city/country
+        return self._cached(make_key('nominatim', city, country), lambda: (self._query_nominatim(city, country), True))[0]
+
+    @metrics.timed('geo.nominatim_request')
+    def _query_nominatim(self, city, country=None):
+        metrics.count('upstream.nominatim')
+        self.http.throttle(NOMINATIM_HOST)
+        location = self.geolocator.geocode(f"{city}, {country}" if country else city)
+        result = None
+        if location:
+            result = {'latitude': location.latitude, 'longitude': location.longitude, 'address': location.address}
+        return result
 
+    @metrics.timed('geo.get_country')
     def get_country(self, city):
-        location = self.geolocator.geocode(city)
+        location = self._geocode(city)
         if location:
-            return location.address.split(',')[-1].strip()
+            return location['address'].split(',')[-1].strip()
         return None
 
     def fetch_coordinates_geopy(self, city, country=None):
-        location = self.geolocator.geocode(f"{city}, {country}" if country else city)
+        location = self._geocode(city, country)
         if location:
-            return location.latitude, location.longitude
+            return location['latitude'], location['longitude']
         return None
 
     def fetch_coordinates_api(self, city):
-        url = "http://transport.opendata.ch/v1/locations"
+        return self._fetch_coordinates_api(city)[0]
+
+    def _fetch_coordinates_api(self, city):
+        # Only definitive answers are cached; transient failures are retried next time
+        coords, complete = self._cached(make_key('opendata', city), lambda: self._query_locations_api(city))
+        return (tuple(coords) if coords else None), complete
+
+    @metrics.timed('geo.locations_request')
+    def _query_locations_api(self, city):
+        metrics.count('upstream.opendata.locations')
+        url = f"{TRANSPORT_API_URL}/locations"
         params = {'query': city}
-        max_retries = 2
 
-        for attempt in range(max_retries):
-            try:
-                response = requests.get(url, params=params)
-                response.raise_for_status()
-                data = response.json()
-
-                if 'stations' in data and data['stations']:
-                    for station in data['stations']:
-                        if 'coordinate' in station and station['coordinate']:
-                            lat = station['coordinate']['x']
-                            lon = station['coordinate']['y']
-                            if lat is not None and lon is not None:
-                                if -90 <= lat <= 90 and -180 <= lon <= 180:
-                                    return lat, lon
-                                
-                break  # If response is OK but no valid data, don't retry
-            
-            except (requests.Timeout, requests.ConnectionError) as e:
-                self.logger.warning(f"Attempt {attempt+1}: Temporary error fetching coordinates for {city}: {e}")
-                if attempt == max_retries - 1:
-                    self.logger.error(f"Failed to fetch coordinates for {city} after {max_retries} attempts.")
-            except requests.HTTPError as e:
-                self.logger.error(f"HTTP error fetching coordinates for {city}: {e}")
-                break  # Hard error, don't retry
-            except Exception as e:
-                self.logger.error(f"Unexpected error fetching coordinates for {city}: {e}")
-                break
-        return None
+        try:
+            response = self.http.get(url, params=params)
+            response.raise_for_status()
+            data = response.json()
 
+            if 'stations' in data and data['stations']:
+                for station in data['stations']:
+                    if 'coordinate' in station and station['coordinate']:
+                        lat = station['coordinate']['x']
+                        lon = station['coordinate']['y']
+                        if lat is not None and lon is not None:
+                            if -90 <= lat <= 90 and -180 <= lon <= 180:
+                                return (lat, lon), True
+            return None, True  # Response is OK but has no valid data
+
+        except (requests.Timeout, requests.ConnectionError) as e:
+            self.logger.error("Failed to fetch coordinates for %s after %d attempts: %s", city, self.http.max_retries + 1, e)
+        except requests.HTTPError as e:
+            self.logger.error("HTTP error fetching coordinates for %s: %s", city, e)
+        except Exception as e:
+            self.logger.error("Unexpected error fetching coordinates for %s: %s", city, e)
+        return None, False
+
+    @metrics.timed('geo.fetch_coordinates')
     def fetch_coordinates(self, city, country=None):
+        # The outcome of the whole fallback chain is cached too, so a city costs at most
+        # one resolution per TTL however many of the upstream steps it needed
+        coords, _ = self._cached(make_key('coords', city, country), lambda: self._resolve_coordinates(city, country))
+        return tuple(coords) if coords else None
+
+    def _resolve_coordinates(self, city, country=None):
         if country and country.lower() not in ["switzerland", "france", "schweiz/suisse/svizzera/svizra", "France"]:
             coords = self.fetch_coordinates_geopy(city, country)
             if coords:
-                return coords
-        coords = self.fetch_coordinates_api(city)
+                return coords, True
+        coords, complete = self._fetch_coordinates_api(city)
         if coords:
-            return coords
-        return self.fetch_coordinates_geopy(city)
+            return coords, True
+        coords = self.fetch_coordinates_geopy(city)
+        # Do not remember "not found" while the opendata answer was only a transient failure
+        return coords, bool(coords) or complete
 
 
 class TransportService:
-    def __init__(self, database, logger):
+    def __init__(self, database, logger, http=None, cache=None):
         self.database = database
         self.logger = logger
+        self.http = http or get_client()
+        self.cache = cache if cache is not None else ConnectionCache()
+        self.verbose = True  # batch mode turns this off to keep stdout clean
 
+    @metrics.timed('transport.fetch_connections')
     def fetch_connections(self, from_city, to_city):
         if self.database.is_blacklisted(from_city, to_city):
-            print(f"Connection from {from_city} to {to_city} is blacklisted. No need to query.")
-            self.logger.info(f"Connection from {from_city} to {to_city} is blacklisted. No need to query.")
+            metrics.count('connections.blacklisted')
+            if self.verbose:
+                print(f"Connection from {from_city} to {to_city} is blacklisted. No need to query.")
+            self.logger.info("Connection from %s to %s is blacklisted. No need to query.", from_city, to_city)
             return []
 
-        url = "http://transport.opendata.ch/v1/connections"
+        key = self.cache.key(from_city, to_city)
+        connections, state = self.cache.get(key)
+        metrics.count(f'connections.cache_{state or "miss"}')
+        if state == 'fresh':
+            return connections
+        if state == 'stale' and connections:
+            # Serve the remaining departures now and refresh the entry behind the caller
+            self.cache.refresh_in_background(key, lambda: self._request_connections(from_city, to_city))
+            return connections
+
+        connections = self._request_connections(from_city, to_city)
+        self.cache.put(key, connections)
+        return connections
+
+    @metrics.timed('transport.connections_request')
+    def _request_connections(self, from_city, to_city):
+        metrics.count('upstream.opendata.connections')
+        url = f"{TRANSPORT_API_URL}/connections"
         params = {
             'from': from_city,
             'to': to_city,
@@ -144,7 +243,7 @@ class TransportService:
             'limit': 6  # Fetch only the next 6 connections
         }
         try:
-            response = requests.get(url, params=params, timeout=20)
+            response = self.http.get(url, params=params)
             response.raise_for_status()
             data = response.json()
             connections = data.get('connections', [])
@@ -153,71 +252,92 @@ class TransportService:
                 self.logger.error("No connections found.")
             return connections
         except requests.RequestException as e:
-            self.logger.error(f"Error fetching connections from {from_city} to {to_city}: {e}")
+            self.logger.error("Error fetching connections from %s to %s: %s", from_city, to_city, e)
             return []
 
     def format_connections(self, connections):
         if not connections:
             return "No valid connections data. Try searching for a connection to Paris first, then from Paris to your final destination."
-
-        formatted = "Time\t\t\tJourney\t\t\tProducts\t\t\tPlatform\n"
-        formatted += "-" * 100 + "\n"
-        for conn in connections:
-            if not isinstance(conn, dict):
-                continue
-
-            from_info = conn.get('from', {})
-            to_info = conn.get('to', {})
-
-            from_departure = from_info.get('departure')
-            from_platform = from_info.get('platform', 'Unknown')
-            to_arrival = to_info.get('arrival')
-            to_platform = to_info.get('platform', 'Unknown')
-
-            from_time = datetime.fromisoformat(from_departure).strftime("%H:%M") if from_departure else 'Unknown'
-            to_time = datetime.fromisoformat(to_arrival).strftime("%H:%M") if to_arrival else 'Unknown'
-
-            duration = conn.get('duration', 'Unknown')
-            if duration != 'Unknown':
-                days, times = duration.split('d')
-                hours, minutes, _ = times.split(':')
-                duration = f"{int(hours)}h {int(minutes)}m" if days == "00" else f"{int(days) * 24 + int(hours)}h {int(minutes)}m"
-
-            products = ", ".join(conn.get('products', ['Unknown']))
-
-            formatted += f"{from_time} - {to_time}\t{duration}\t\t{products}\t\t{from_platform} to {to_platform}\n"
-
-        return formatted
+        return render_table(parse_connections(connections))
 
 
 class RouteCalculator:
+    max_angle = 25  # degrees around the start -> end bearing
+
     def __init__(self, database, logger):
         self.database = database
         self.logger = logger
-
+        self._cities_version = None
+        self._city_index = None
+        self._distance_engine = None
+        self._lock = threading.Lock()
+
+    def _check_cities_version(self):
+        version = self.database.cities_version()
+        if version != self._cities_version:
+            self._cities_version = version
+            self._city_index = None
+            self._distance_engine = None
+
+    def get_city_index(self):
+        with self._lock:
+            self._check_cities_version()
+            if self._city_index is None:
+                with metrics.span('route.build_city_index'):
+                    self._city_index = CityIndex(self.database.get_all_cities())
+                self.logger.info("Built city index with %d cities", len(self._city_index))
+            return self._city_index
+
+    def get_distance_engine(self):
+        with self._lock:
+            self._check_cities_version()
+            if self._distance_engine is None:
+                from distance_engine import BatchDistanceEngine  # numpy, only needed for batch scoring
+
+                with metrics.span('route.build_distance_engine'):
+                    self._distance_engine = BatchDistanceEngine(self.database.get_all_cities())
+            return self._distance_engine
+
+    @metrics.timed('route.nearest_city_within_angle')
     def find_nearest_city_within_angle(self, start_coords, end_coords):
-        start_lat, start_lon = start_coords
-        end_lat, end_lon = end_coords
-        min_distance = float('inf')
-        nearest_city = None
-
-        for city in self.database.get_all_cities():
-            city_lat, city_lon = city['latitude'], city['longitude']
-            angle_diff = abs(start_lon - end_lon)
-
-            if angle_diff <= 25:
-                distance = haversine((end_lat, end_lon), (city_lat, city_lon))
-                if distance < min_distance:
-                    min_distance = distance
-                    nearest_city = city
-
+        nearest_city, _ = self.get_city_index().nearest_in_cone(start_coords, end_coords, self.max_angle)
         return nearest_city
 
+    @metrics.timed('route.percentage_covered')
     def calculate_percentage_covered(self, start_coords, intermediate_coords, end_coords):
-        total_distance = haversine(start_coords, end_coords)
-        partial_distance = haversine(start_coords, intermediate_coords)
+        total_distance = haversine_km(start_coords, end_coords)
+        partial_distance = haversine_km(start_coords, intermediate_coords)
         return (partial_distance / total_distance) * 100
 
+    @metrics.timed('route.score_many')
+    def score_many(self, pairs):
+        """
+        Score many (start_coords, end_coords) pairs in one vectorized pass.
+        Returns one dict per pair with the nearest city within angle (or None),
+        the total distance, the start -> end bearing and the percentage covered.
+        """
+        pairs = list(pairs)
+        if not pairs:
+            return []
+        engine = self.get_distance_engine()
+        scores = engine.score([start for start, _ in pairs], [end for _, end in pairs], self.max_angle)
+
+        results = []
+        for i in range(len(pairs)):
+            index = int(scores['index'][i])
+            found = index >= 0
+            results.append({
+                'nearest_city': engine.cities[index] if found else None,
+                'total_km': float(scores['total_km'][i]),
+                'bearing': float(scores['heading'][i]),
+                'remaining_km': float(scores['remaining_km'][i]) if found else None,
+                'percentage_covered': float(scores['percentage_covered'][i]) if found else None,
+            })
+        return results
+
+
+BATCH_CSV_COLUMNS = ('from', 'to', 'status', 'mode', 'error') + CSV_COLUMNS
+
 
 class InputValidator:
     @staticmethod
@@ -227,13 +347,54 @@ class InputValidator:
 
 
 class TrainApp:
-    def __init__(self):
+    """
+    Services are built on first use, so a query only pays for the ones it needs:
+    a domestic query never loads geopy, numpy or the reachability matrix.
+    """
+    def __init__(self, db_file='city_data.json'):
         self.logger = Logger()
-        self.database = Database()
-        self.geo_service = GeoService(self.logger)
-        self.transport_service = TransportService(self.database, self.logger)
-        self.route_calculator = RouteCalculator(self.database, self.logger)
+        self.database = Database(db_file)
         self.validator = InputValidator()
+        self._services = {}
+        self._services_lock = threading.RLock()  # building one service may build another
+
+    def _service(self, name, build):
+        if name not in self._services:
+            with self._services_lock:
+                if name not in self._services:
+                    self._services[name] = build()
+        return self._services[name]
+
+    @property
+    def geocode_cache(self):
+        return self._service('geocode_cache', GeocodeCache)
+
+    @property
+    def geo_service(self):
+        return self._service('geo_service', lambda: GeoService(self.logger, self.geocode_cache))
+
+    @property
+    def transport_service(self):
+        return self._service('transport_service', lambda: TransportService(self.database, self.logger))
+
+    @property
+    def route_calculator(self):
+        return self._service('route_calculator', lambda: RouteCalculator(self.database, self.logger))
+
+    @property
+    def country_resolver(self):
+        return self._service('country_resolver', lambda: CountryResolver(self.database, self.geocode_cache))
+
+    @property
+    def route_planner(self):
+        """RoutePlanner over reachability_matrix.bin, or None if the matrix has not been built."""
+        def build():
+            from reachability_matrix import MATRIX_FILE
+            from route_planner import RoutePlanner
+
+            return RoutePlanner.from_file(MATRIX_FILE) if os.path.exists(MATRIX_FILE) else None
+
+        return self._service('route_planner', build)
 
     def get_city_input(self, prompt):
         for _ in range(3):  # Allow up to 3 attempts
@@ -244,27 +405,36 @@ class TrainApp:
         print("Too many invalid attempts. Exiting.")
         return None
 
-    def run(self):
-        print("Enter the city names of your planned journey.")
-
-        start_city = self.get_city_input("Enter the start city: ")
-        if not start_city:
-            return
-
-        end_city = self.get_city_input("Enter the final city: ")
-        if not end_city:
-            return
+    def resolve_country(self, city):
+        # Offline answer first; only unknown cities cost a Nominatim round-trip
+        return self.country_resolver.resolve(city) or self.geo_service.get_country(city)
+
+    @metrics.timed('app.plan_journey')
+    def plan_journey(self, start_city, end_city):
+        """Plan one journey and return the outcome as a JSON-serializable dict."""
+        started = time.perf_counter()
+        result = self._plan_journey(start_city, end_city)
+        self.logger.info("Planned %s to %s", start_city, end_city, extra={
+            'from_city': start_city,
+            'to_city': end_city,
+            'status': result['status'],
+            'mode': result.get('mode'),
+            'latency_ms': round((time.perf_counter() - started) * 1000, 3),
+        })
+        return result
+
+    def _plan_journey(self, start_city, end_city):
+        result = {'from': start_city, 'to': end_city, 'status': 'ok'}
 
         # Log
-        self.logger.info(f"User query: From {start_city} to {end_city}")
+        self.logger.info("User query: From %s to %s", start_city, end_city)
 
-        start_country = self.geo_service.get_country(start_city)
-        end_country = self.geo_service.get_country(end_city)
+        start_country = self.resolve_country(start_city)
+        end_country = self.resolve_country(end_city)
 
         if not start_country or not end_country:
-            print("Could not determine the country for one or both cities. Please check your input.")
             self.logger.error("Could not determine the country for one or both cities.")
-            return
+            return dict(result, status='error', error="Could not determine the country for one or both cities. Please check your input.")
 
         start_country = start_country.lower().strip()
         end_country = end_country.lower().strip()
@@ -272,55 +442,170 @@ class TrainApp:
         if start_country in ["switzerland", "schweiz/suisse/svizzera/svizra", "france"] and end_country in [
             "switzerland", "schweiz/suisse/svizzera/svizra", "france"]:
             connections = self.transport_service.fetch_connections(start_city, end_city)
-            if connections:
-                self.logger.info(f"Connections found from {start_city} to {end_city}")
-                print("\nConnections from {} to {}:".format(start_city, end_city))
-                print(self.transport_service.format_connections(connections))
-            else:
-                self.logger.error(f"Could not fetch connections from {start_city} to {end_city}.")
-                print(f"Could not fetch connections from {start_city} to {end_city}.")
+            if not connections:
+                self.logger.error("Could not fetch connections from %s to %s.", start_city, end_city)
+                itinerary = self.plan_multi_hop(start_city, end_city)
+                if itinerary:
+                    self.logger.info("Multi-leg route from %s to %s with %d transfer(s)", start_city, end_city, itinerary['transfers'])
+                    return dict(result, mode='multi_hop', itinerary=itinerary)
+                return dict(result, status='error', error=f"Could not fetch connections from {start_city} to {end_city}.")
+            self.logger.info("Connections found from %s to %s", start_city, end_city)
+            return dict(result, mode='direct', connections=connections)
+
+        # Fetch coordinates for start and end cities
+        start_coords = self.geo_service.fetch_coordinates(start_city)
+        end_coords = self.geo_service.fetch_coordinates(end_city, "Italy" if end_city.lower() == "roma" else None)
+
+        if not start_coords or not end_coords:
+            self.logger.error("Could not fetch coordinates for one or both cities.")
+            return dict(result, status='error', error="Could not fetch coordinates for one or both cities.")
+
+        nearest_city = self.route_calculator.find_nearest_city_within_angle(start_coords, end_coords)
+        if not nearest_city:
+            self.logger.error("No suitable intermediate city found.")
+            return dict(result, status='error', error="No suitable intermediate city found.")
+
+        percentage_covered = self.route_calculator.calculate_percentage_covered(
+            start_coords,
+            (nearest_city['latitude'], nearest_city['longitude']),
+            end_coords
+        )
+        self.logger.info("Nearest city within line of sight: %s (%s)", nearest_city['city'], nearest_city['name'])
+        self.logger.info("Percentage of trip covered to %s: %.2f%%", nearest_city['city'], percentage_covered)
+        country = end_country.capitalize()
+        train_company_url = self.database.get_train_company(country)
+        if train_company_url:
+            self.logger.info("Train company for %s: %s", country, train_company_url)
         else:
-            # Fetch coordinates for start and end cities
-            start_coords = self.geo_service.fetch_coordinates(start_city)
-            end_coords = self.geo_service.fetch_coordinates(end_city, "Italy" if end_city.lower() == "roma" else None)
-
-            if not start_coords or not end_coords:
-                self.logger.error("Could not fetch coordinates for one or both cities.")
-                print("Could not fetch coordinates for one or both cities.")
-                return
-            
-            nearest_city = self.route_calculator.find_nearest_city_within_angle(start_coords, end_coords)
-            if nearest_city:
-                percentage_covered = self.route_calculator.calculate_percentage_covered(
-                    start_coords,
-                    (nearest_city['latitude'], nearest_city['longitude']),
-                    end_coords
-                )
-                self.logger.info(f"Nearest city within line of sight: {nearest_city['city']} ({nearest_city['name']})")
-                self.logger.info(f"Percentage of trip covered to {nearest_city['city']}: {percentage_covered:.2f}%")
-                train_company_url = self.database.get_train_company(end_country.capitalize())
-                print(f"\nConnections from {start_city} to {end_city}:")
-                if train_company_url:
-                    self.logger.info(f"Train company for {end_country.capitalize()}: {train_company_url}")
-                    print(f"Train company for {end_country.capitalize()}: {train_company_url}")
+            self.logger.error("Train company information not found for %s.", country)
+        return dict(result, mode='intermediate', nearest_city=dict(nearest_city), percentage_covered=percentage_covered,
+                    country=country, train_company_url=train_company_url,
+                    itinerary=self.plan_multi_hop(start_city, nearest_city['city']))
+
+    def plan_multi_hop(self, start_city, end_city):
+        """Fastest multi-leg itinerary from the cached reachability matrix, or None."""
+        if self.route_planner is None or start_city not in self.route_planner or end_city not in self.route_planner:
+            return None
+        return self.route_planner.plan(start_city, end_city)
+
+    @staticmethod
+    def print_itinerary(itinerary):
+        from route_planner import format_itinerary
+
+        print(format_itinerary(itinerary))
+
+    def print_journey(self, result):
+        if result['status'] == 'error':
+            print(result['error'])
+            return
+
+        start_city, end_city = result['from'], result['to']
+        if result['mode'] == 'direct':
+            print("\nConnections from {} to {}:".format(start_city, end_city))
+            print(self.transport_service.format_connections(result['connections']))
+            return
+        if result['mode'] == 'multi_hop':
+            print(f"\nNo direct connections from {start_city} to {end_city}. Fastest route over cached connections:")
+            self.print_itinerary(result['itinerary'])
+            return
+
+        nearest_city = result['nearest_city']
+        print(f"\nConnections from {start_city} to {end_city}:")
+        if result['train_company_url']:
+            print(f"Train company for {result['country']}: {result['train_company_url']}")
+        else:
+            print(f"Train company information not found for {result['country']}.")
+        print(f"Nearest city within line of sight: {nearest_city['city']} ({nearest_city['name']})")
+        print(f"Percentage of trip covered to {nearest_city['city']}: {result['percentage_covered']:.2f}%")
+        if result.get('itinerary'):
+            print(f"\nRoute to {nearest_city['city']}:")
+            self.print_itinerary(result['itinerary'])
+
+    def run(self):
+        print("Enter the city names of your planned journey.")
+
+        start_city = self.get_city_input("Enter the start city: ")
+        if not start_city:
+            return
+
+        end_city = self.get_city_input("Enter the final city: ")
+        if not end_city:
+            return
+
+        self.print_journey(self.plan_journey(start_city, end_city))
+
+    def run_batch(self, journeys, output, workers=8, output_format='jsonl'):
+        """
+        Plan many (start_city, end_city) pairs concurrently, sharing this app's caches,
+        and write the results to output in input order: one JSON line per journey, or
+        with output_format='csv' one row per direct connection (one row for other results).
+        """
+        self.transport_service.verbose = False
+
+        def plan(journey):
+            start_city, end_city = journey
+            if not (self.validator.is_valid_city_name(start_city) and self.validator.is_valid_city_name(end_city)):
+                return {'from': start_city, 'to': end_city, 'status': 'error', 'error': "Invalid city name."}
+            try:
+                return self.plan_journey(start_city.strip(), end_city.strip())
+            except Exception as e:
+                self.logger.error("Failed to plan %s to %s: %s", start_city, end_city, e)
+                return {'from': start_city, 'to': end_city, 'status': 'error', 'error': str(e)}
+
+        if output_format == 'csv':
+            writer = csv.writer(output)
+            writer.writerow(BATCH_CSV_COLUMNS)
+
+            def write(result):
+                journey = [result['from'], result['to'], result['status'], result.get('mode', ''), result.get('error', '')]
+                connections = parse_connections(result.get('connections'))
+                if connections:
+                    writer.writerows(journey + connection.csv_row() for connection in connections)
                 else:
-                    self.logger.error(f"Train company information not found for {end_country.capitalize()}.")
-                    print(f"Train company information not found for {end_country.capitalize()}.")
-                print(f"Nearest city within line of sight: {nearest_city['city']} ({nearest_city['name']})")
-                print(f"Percentage of trip covered to {nearest_city['city']}: {percentage_covered:.2f}%")
-            else:
-                self.logger.error("No suitable intermediate city found.")
-                print("No suitable intermediate city found.")
+                    writer.writerow(journey + [''] * len(CSV_COLUMNS))
+        else:
+            def write(result):
+                output.write(json.dumps(result, ensure_ascii=False) + "\n")
+
+        count = 0
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for result in pool.map(plan, journeys):
+                write(result)
+                output.flush()
+                count += 1
+        self.database.blacklist.flush()
+        return count
 
 
 if __name__ == "__main__":
-    db_file = 'city_data.json'
+    parser = argparse.ArgumentParser(description="Find train connections between two cities.")
+    parser.add_argument('--batch', metavar='FILE', help="plan every journey in a CSV/JSONL file ('-' for stdin) and print JSONL results")
+    parser.add_argument('--output', metavar='FILE', help="write batch results to FILE instead of stdout")
+    parser.add_argument('--workers', type=int, default=8, help="concurrent journeys in batch mode")
+    parser.add_argument('--format', choices=('jsonl', 'csv'), default='jsonl', help="batch output format")
+    parser.add_argument('--metrics', action='store_true', help="time the hot paths and print a summary to stderr on exit")
+    args = parser.parse_args()
+    if args.metrics:
+        metrics.enable()
+
+    # Prefer the SQLite database once city_data.json has been migrated
+    db_file = default_db_file()
     
     # Initialize database if it doesn't exist
     if not os.path.exists(db_file):
-        print(f"Database file {db_file} not found. Initializing database...")
+        print(f"Database file {db_file} not found. Initializing database...", file=sys.stderr if args.batch else sys.stdout)
+        from db_initializer import DatabaseInitializer
+
         initializer = DatabaseInitializer(db_file)
         initializer.initialize_database()
         
-    app = TrainApp()
-    app.run()
\ No newline at end of file
+    app = TrainApp(db_file)
+    if args.batch:
+        source = sys.stdin if args.batch == '-' else open(args.batch, encoding='utf-8', newline='')
+        output = open(args.output, 'w', encoding='utf-8', newline='') if args.output else sys.stdout
+        with source, output:
+            app.run_batch(read_journeys(source), output, args.workers, args.format)
+    else:
+        app.run()
+    if metrics.enabled:
+        print(metrics.summary(), file=sys.stderr)
\ No newline at end of file